@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+from collections import deque
+
+WHITELIST_FILE = 'whitelist.txt'
+
+USER = 'user'
+ADMIN = 'admin'
+ROLE_RANK = {USER: 0, ADMIN: 1}
+
+# Lowest role allowed to run each command; unlisted commands need USER
+COMMAND_ROLES = {
+    'admin_stats': ADMIN,
+    'reload_whitelist': ADMIN,
+}
+
+# command -> (calls, seconds) per user; these hit the exchanges, render charts
+# or grow the alert table, stream subscriptions and journal
+RATE_LIMITS = {
+    'info': (6, 60),
+    'chart': (3, 60),
+    'create_alert': (10, 60),
+}
+
+
+class AccessControl:
+    """Whitelist with roles and per-user rate limits, read from `whitelist.txt`.
+
+    Each line is a username or numeric user id, optionally followed by a
+    role (`agungw9 admin`); the role defaults to user. The file is parsed
+    once and only reread when its mtime changes or `reload()` is called.
+    """
+
+    def __init__(self, path=WHITELIST_FILE, admins=(), command_roles=COMMAND_ROLES, rate_limits=RATE_LIMITS):
+        self.path = path
+        self.admins = set(admins)
+        self.command_roles = command_roles
+        self.rate_limits = rate_limits
+        self.lock = threading.Lock()
+        self.roles = {}
+        self.mtime = None
+        self.calls = {}
+
+    def reload(self):
+        with self.lock:
+            self._load()
+        return len(self.roles)
+
+    def _load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path) as file:
+                lines = file.read().splitlines()
+        except FileNotFoundError:
+            mtime, lines = None, []
+
+        roles = {}
+        for line in lines:
+            parts = line.split()
+            if parts:
+                roles[parts[0]] = parts[1] if len(parts) > 1 and parts[1] in ROLE_RANK else USER
+        roles.update({admin: ADMIN for admin in self.admins})
+        self.roles = roles
+        self.mtime = mtime
+
+    def _refresh(self):
+        # One stat per message instead of reading the file
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self.mtime or not self.roles:
+            self._load()
+
+    def role(self, username, user_id):
+        with self.lock:
+            self._refresh()
+            return self.roles.get(username) or self.roles.get(str(user_id))
+
+    def _rate_limited(self, key, command, now):
+        if command not in self.rate_limits:
+            return False
+        limit, period = self.rate_limits[command]
+        calls = self.calls.setdefault((key, command), deque())
+        while calls and now - calls[0] >= period:
+            calls.popleft()
+        if len(calls) >= limit:
+            return True
+        calls.append(now)
+        return False
+
+    def check(self, username, user_id, command):
+        """None when the user may run `command` now, otherwise the reason to reply with."""
+        role = self.role(username, user_id)
+        if role is None:
+            return 'You are not authorized to use this bot.'
+        if ROLE_RANK[role] < ROLE_RANK[self.command_roles.get(command, USER)]:
+            return 'This command is for admins only.'
+        with self.lock:
+            if self._rate_limited(str(user_id), command, time.monotonic()):
+                limit, period = self.rate_limits[command]
+                return f'Too many /{command} requests, at most {limit} per {period}s. Please wait a moment.'
+        return None
@@ -0,0 +1,463 @@
+import bisect
+import csv
+import json
+import os
+import threading
+import time
+from collections import Counter, namedtuple
+
+import numpy as np
+
+from metrics import metrics
+
+ALERTS_FILE = 'alerts.csv'
+JOURNAL_FILE = 'alerts.journal'
+# The snapshot is rewritten once the journal holds this many entries, or
+# this share of the alert count if that is more, so compaction stays O(1) per change
+COMPACT_EVERY = 100
+COMPACT_SHARE = 0.5
+# Alerts added since the last compile are kept in a small side table; past
+# this many, or once this share of the compiled rows was removed, recompile
+RECOMPILE_AFTER = 1000
+RECOMPILE_DEAD_SHARE = 0.5
+
+# Threshold comparisons fire once and are then removed
+COMPARISONS = ['<', '>', '<=', '>=', '==']
+# price = percent, param = window in seconds: |move over the window| >= percent
+MOVE = 'move'
+# price = level, param = hysteresis percent: fires on every crossing, stays active
+CROSS = 'cross'
+OPERATORS = COMPARISONS + [MOVE, CROSS]
+OPERATOR_CODES = {operator: code for code, operator in enumerate(OPERATORS)}
+LT, GT, LE, GE, EQ, MOVE_CODE, CROSS_CODE = range(len(OPERATORS))
+
+COLUMNS = ['id', 'chat_id', 'coin', 'operator', 'price', 'param']
+
+# Older snapshots and journals have no param column
+Alert = namedtuple('Alert', COLUMNS, defaults=(0.0,))
+
+# Longest window kept for move alerts, at most one sample per coin per minute
+MAX_WINDOW = 7 * 24 * 3600
+SAMPLE_SPACING = 60
+
+
+WINDOW_UNITS = {'m': 60, 'h': 3600, 'd': 86400}
+
+
+def is_one_shot(alert):
+    return alert.operator != CROSS
+
+
+def is_portfolio_coin(coin):
+    # Total_USDT, Total_BTC, ...: a chat's own portfolio value, not a market price
+    return 'Total' in coin
+
+
+def price_key(alert):
+    """What the alert is priced by: the coin, or for portfolio values the coin in that chat."""
+    return f'{alert.coin}@{alert.chat_id}' if is_portfolio_coin(alert.coin) else alert.coin
+
+
+def split_price_key(key):
+    # 'Total_USDT@42' -> ('Total_USDT', 42), 'BTC' -> ('BTC', None)
+    coin, _, chat_id = key.partition('@')
+    return coin, int(chat_id) if chat_id else None
+
+
+def parse_window(text, max_window=MAX_WINDOW):
+    """'15m', '4h', '1d' -> seconds."""
+    unit = WINDOW_UNITS.get(text[-1:].lower())
+    if unit is None:
+        raise ValueError(f'Invalid window {text!r}, use e.g. 15m, 4h or 1d')
+    seconds = float(text[:-1]) * unit
+    if not 0 < seconds <= max_window:
+        raise ValueError(f'Window must be between 1m and {max_window // 86400}d')
+    return seconds
+
+
+def format_window(seconds):
+    for unit, size in sorted(WINDOW_UNITS.items(), key=lambda item: -item[1]):
+        if seconds >= size and seconds % size == 0:
+            return f'{seconds / size:g}{unit}'
+    return f'{seconds / 60:g}m'
+
+
+def describe(alert):
+    if alert.operator == MOVE:
+        return f'{alert.coin} moves {alert.price:g}% within {format_window(alert.param)}'
+    if alert.operator == CROSS:
+        return f'{alert.coin} crosses {alert.price:g} (±{alert.param:g}%)'
+    return f'{alert.coin} {alert.operator} {alert.price}'
+
+
+class PriceHistory:
+    """Recent prices per coin, enough to look back over the longest move window."""
+
+    def __init__(self, max_window=MAX_WINDOW, spacing=SAMPLE_SPACING):
+        self.max_window = max_window
+        self.spacing = spacing
+        self.times = {}
+        self.prices = {}
+
+    def record(self, coin, price, now):
+        times = self.times.setdefault(coin, [])
+        if times and now - times[-1] < self.spacing:
+            return
+        prices = self.prices.setdefault(coin, [])
+        times.append(now)
+        prices.append(price)
+        if now - times[0] > self.max_window:
+            expired = bisect.bisect_left(times, now - self.max_window)
+            del times[:expired], prices[:expired]
+
+    def price_at(self, coin, when):
+        # Last price recorded at or before `when`, NaN when history is shorter
+        i = bisect.bisect_right(self.times.get(coin, []), when)
+        return self.prices[coin][i - 1] if i else np.nan
+
+
+class AlertTable:
+    """Every alert as parallel NumPy columns, sorted by coin.
+
+    One coin's alerts are a contiguous slice, so a single tick only looks
+    at its own rows, while a full check compares all rows in one pass.
+    Rows are keyed by price_key, so each chat's portfolio alerts are their own "coin".
+    Removed alerts are only masked out; additions need a new table.
+    """
+
+    def __init__(self, alerts, sides):
+        alerts = list(alerts)
+        columns = list(zip(*alerts)) if alerts else [()] * len(COLUMNS)
+        ids, _, _, operators, prices, params = columns
+        coins = [price_key(alert) for alert in alerts]
+
+        self.coins, coin_codes = np.unique(np.array(coins, dtype=str), return_inverse=True)
+        self.coins = self.coins.tolist()
+        self.codes = {coin: i for i, coin in enumerate(self.coins)}
+        order = np.argsort(coin_codes, kind='stable')
+
+        self.alerts = [alerts[i] for i in order.tolist()]
+        self.ids = np.array(ids, np.int64)[order]
+        self.coin_codes = coin_codes.astype(np.int32)[order]
+        self.operators = np.array([OPERATOR_CODES[operator] for operator in operators], np.int8)[order]
+        self.prices = np.array(prices, np.float64)[order]
+        self.params = np.array(params, np.float64)[order]
+        self.active = np.ones(len(alerts), bool)
+        self.row_of = dict(zip(self.ids.tolist(), range(len(alerts))))
+        self.starts = np.searchsorted(self.coin_codes, np.arange(len(self.coins) + 1))
+
+        # Cross alerts: +1 above the band, -1 below, 0 not seen yet
+        self.sides = np.zeros(len(alerts), np.int8)
+        self.set_sides(sides)
+        self.dead = 0
+
+        # Move alerts grouped by (coin, window): one history lookup per group
+        self.move_group = np.full(len(alerts), -1, np.int64)
+        is_move = self.operators == MOVE_CODE
+        if is_move.any():
+            keys = self.coin_codes[is_move].astype(np.int64) * (MAX_WINDOW + 1) + self.params[is_move].astype(np.int64)
+            unique, self.move_group[is_move] = np.unique(keys, return_inverse=True)
+            self.move_pairs = [(self.coins[key // (MAX_WINDOW + 1)], key % (MAX_WINDOW + 1)) for key in unique.tolist()]
+        else:
+            self.move_pairs = []
+
+    def set_sides(self, sides):
+        for alert_id, side in sides.items():
+            row = self.row_of.get(alert_id)
+            if row is not None:
+                self.sides[row] = side
+
+    def deactivate(self, alert_id):
+        row = self.row_of.get(alert_id)
+        if row is not None and self.active[row]:
+            self.active[row] = False
+            self.dead += 1
+
+    def coin_slice(self, coin):
+        code = self.codes.get(coin)
+        if code is None:
+            return slice(0, 0)
+        return slice(int(self.starts[code]), int(self.starts[code + 1]))
+
+    def move_references(self, rows, history, now):
+        group = self.move_group[rows]
+        reference = np.full(len(group), np.nan)
+        is_move = group >= 0
+        if not is_move.any():
+            return reference
+        needed = np.unique(group[is_move])
+        lookups = np.full(len(self.move_pairs), np.nan)
+        lookups[needed] = [history.price_at(coin, now - window)
+                           for coin, window in (self.move_pairs[g] for g in needed.tolist())]
+        reference[is_move] = lookups[group[is_move]]
+        return reference
+
+    def evaluate(self, rows, price, history, now):
+        """Row numbers of the triggered alerts and of the cross alerts whose side changed.
+
+        `rows` is a slice of the table and `price` each of its rows' current price.
+        """
+        operator = self.operators[rows]
+        threshold = self.prices[rows]
+
+        # NaN prices (coin not priced this tick) compare False everywhere
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fired = ((operator == LT) & (price < threshold)) \
+                | ((operator == GT) & (price > threshold)) \
+                | ((operator == LE) & (price <= threshold)) \
+                | ((operator == GE) & (price >= threshold)) \
+                | ((operator == EQ) & (price == threshold))
+
+            reference = self.move_references(rows, history, now)
+            fired |= (operator == MOVE_CODE) & (np.abs(price - reference) / reference * 100 >= threshold)
+
+            band = threshold * self.params[rows] / 100
+            side = self.sides[rows]
+            new_side = np.where(price >= threshold + band, 1, np.where(price <= threshold - band, -1, side)).astype(np.int8)
+            changed = (operator == CROSS_CODE) & (new_side != side) & self.active[rows]
+            # The first price only sets the side; later flips are crossings
+            fired |= changed & (side != 0)
+        fired &= self.active[rows]
+
+        offset = rows.start or 0
+        changed_rows = np.flatnonzero(changed) + offset
+        self.sides[changed_rows] = new_side[changed]
+        return np.flatnonzero(fired) + offset, changed_rows
+
+
+class AlertEngine:
+    """Alerts compiled into an `AlertTable`, persisted as a CSV snapshot plus an append-only journal.
+
+    Every change is appended to the journal; once needs_compact() says it
+    has grown enough, compact() rewrites the snapshot and drops the journal.
+    Like recompile(), it is meant to run off the event loop.
+    Additions go to a small table of their own, evaluated next to the
+    compiled one, so adding never rebuilds the big table on the caller's
+    thread; recompile() folds them in and is meant to run off the event
+    loop once needs_recompile() says so.
+    """
+
+    def __init__(self, alerts_file=ALERTS_FILE, journal_file=JOURNAL_FILE, compact_every=COMPACT_EVERY):
+        self.alerts_file = alerts_file
+        self.journal_file = journal_file
+        self.compact_every = compact_every
+        self.lock = threading.RLock()
+        self.alerts = {}
+        self.coin_counts = Counter()
+        self.chat_counts = Counter()
+        self.sides = {}
+        self.history = PriceHistory()
+        self.next_id = 1
+        self.journal_size = 0
+        # Alerts not in `table` yet, and their side table, built on demand
+        self.added = {}
+        self.recent = None
+        # Alerts removed while a recompile runs, masked out once it is swapped in
+        self.removed_while_compiling = None
+        self.compile_lock = threading.Lock()
+        self.compact_lock = threading.Lock()
+        # The journal being folded into a new snapshot; replayed too if a compaction was cut short
+        self.rotated_journal = journal_file + '.old'
+        self._load()
+        self.table = AlertTable(self.alerts.values(), self.sides)
+        self.added.clear()
+
+    def _insert(self, alert):
+        if alert.id in self.alerts:
+            # Replaying a rotated journal the snapshot already covers
+            return
+        self.alerts[alert.id] = alert
+        self.coin_counts[price_key(alert)] += 1
+        self.chat_counts[alert.chat_id] += 1
+        self.next_id = max(self.next_id, alert.id + 1)
+        self.added[alert.id] = alert
+        self.recent = None
+
+    def _delete(self, alert_id):
+        alert = self.alerts.pop(alert_id, None)
+        if alert is None:
+            return
+        key = price_key(alert)
+        self.coin_counts[key] -= 1
+        if not self.coin_counts[key]:
+            del self.coin_counts[key]
+        self.chat_counts[alert.chat_id] -= 1
+        if not self.chat_counts[alert.chat_id]:
+            del self.chat_counts[alert.chat_id]
+        self.sides.pop(alert_id, None)
+        if self.added.pop(alert_id, None) is not None:
+            if self.recent is not None:
+                self.recent.deactivate(alert_id)
+        else:
+            self.table.deactivate(alert_id)
+        if self.removed_while_compiling is not None:
+            self.removed_while_compiling.append(alert_id)
+
+    def _load(self):
+        # Replayed into an empty table; the real one is compiled once loading is done
+        self.table = AlertTable([], {})
+        needs_ids = False
+        if os.path.isfile(self.alerts_file):
+            with open(self.alerts_file, newline='') as file:
+                for row in csv.DictReader(file):
+                    # Older snapshots were written without an id column
+                    needs_ids = needs_ids or not row.get('id')
+                    alert_id = int(row['id']) if row.get('id') else self.next_id
+                    param = float(row['param']) if row.get('param') else 0.0
+                    self._insert(Alert(alert_id, int(row['chat_id']), row['coin'], row['operator'], float(row['price']), param))
+
+        for journal_file in (self.rotated_journal, self.journal_file):
+            if not os.path.isfile(journal_file):
+                continue
+            with open(journal_file) as file:
+                for line in file:
+                    entry = json.loads(line)
+                    if entry['op'] == 'add':
+                        self._insert(Alert(*entry['alert']))
+                    else:
+                        self._delete(entry['id'])
+                    self.journal_size += 1
+
+        if needs_ids:
+            self.compact()
+
+    def _journal(self, entries):
+        with open(self.journal_file, 'a') as file:
+            for entry in entries:
+                file.write(json.dumps(entry) + '\n')
+        self.journal_size += len(entries)
+
+    def needs_compact(self):
+        with self.lock:
+            return self.journal_size >= max(self.compact_every, COMPACT_SHARE * len(self.alerts))
+
+    def compact(self):
+        """Rewrite the snapshot from every alert and drop the journal it covers.
+
+        Only the journal rotation holds the lock; the CSV is written without
+        it, while later changes go to a fresh journal. Returns False when
+        another compaction is already running.
+        """
+        if not self.compact_lock.acquire(blocking=False):
+            return False
+        try:
+            with self.lock:
+                alerts = list(self.alerts.values())
+                if os.path.isfile(self.journal_file):
+                    os.replace(self.journal_file, self.rotated_journal)
+                self.journal_size = 0
+            with metrics.timer('alerts.compact'):
+                tmp_file = self.alerts_file + '.tmp'
+                with open(tmp_file, 'w', newline='') as file:
+                    writer = csv.writer(file)
+                    writer.writerow(COLUMNS)
+                    writer.writerows(alerts)
+                os.replace(tmp_file, self.alerts_file)
+            if os.path.isfile(self.rotated_journal):
+                os.remove(self.rotated_journal)
+            return True
+        finally:
+            self.compact_lock.release()
+
+    def add(self, chat_id, coin, operator, price, param=0.0):
+        with self.lock:
+            alert = Alert(self.next_id, chat_id, coin, operator, price, param)
+            self._insert(alert)
+            self._journal([{'op': 'add', 'alert': list(alert)}])
+            return alert
+
+    def remove(self, alert_ids):
+        with self.lock:
+            alert_ids = [alert_id for alert_id in alert_ids if alert_id in self.alerts]
+            for alert_id in alert_ids:
+                self._delete(alert_id)
+            if alert_ids:
+                self._journal([{'op': 'del', 'id': alert_id} for alert_id in alert_ids])
+            return len(alert_ids)
+
+    def delete(self, chat_id, coin):
+        with self.lock:
+            return self.remove([a.id for a in self.alerts.values() if a.chat_id == chat_id and a.coin == coin])
+
+    def list(self, chat_id):
+        with self.lock:
+            return [a for a in self.alerts.values() if a.chat_id == chat_id]
+
+    def count(self, chat_id):
+        with self.lock:
+            return self.chat_counts[chat_id]
+
+    def coins(self):
+        """Distinct price keys of every alert; see price_key."""
+        with self.lock:
+            return list(self.coin_counts)
+
+    def needs_recompile(self):
+        with self.lock:
+            return len(self.added) >= RECOMPILE_AFTER \
+                or self.table.dead > RECOMPILE_DEAD_SHARE * max(len(self.table.alerts), RECOMPILE_AFTER)
+
+    def recompile(self):
+        """Rebuild the compiled table from every alert, without holding the lock while building.
+
+        Evaluations meanwhile keep using the old table and the side table;
+        changes made during the build are applied before the new table is
+        swapped in. Returns False when another recompile is already running.
+        """
+        if not self.compile_lock.acquire(blocking=False):
+            return False
+        try:
+            with self.lock:
+                alerts = list(self.alerts.values())
+                sides = dict(self.sides)
+                self.removed_while_compiling = []
+            with metrics.timer('alerts.compile'):
+                table = AlertTable(alerts, sides)
+            with self.lock:
+                for alert_id in self.removed_while_compiling:
+                    table.deactivate(alert_id)
+                # Whatever was added during the build stays in the side table
+                self.added = {alert_id: alert for alert_id, alert in self.added.items() if alert_id not in table.row_of}
+                # Sides that moved on the old tables while this one was built
+                table.set_sides(self.sides)
+                self.table = table
+                self.recent = None
+                self.removed_while_compiling = None
+            return True
+        finally:
+            self.compile_lock.release()
+
+    def _tables(self):
+        # The compiled table, plus the side table of later additions if there are any
+        if self.added and self.recent is None:
+            self.recent = AlertTable(self.added.values(), self.sides)
+        return [self.table, self.recent] if self.added else [self.table]
+
+    def _triggered(self, table, rows, price, now):
+        fired, changed = table.evaluate(rows, price, self.history, now)
+        # Keep cross sides across recompiles
+        self.sides.update(zip(table.ids[changed].tolist(), table.sides[changed].tolist()))
+        return [table.alerts[row] for row in fired.tolist()]
+
+    def evaluate(self, coin, price, now=None):
+        """Alerts on `coin` that trigger at `price`; one-shot alerts stay active until removed."""
+        now = time.time() if now is None else now
+        with self.lock:
+            self.history.record(coin, price, now)
+            triggered = []
+            for table in self._tables():
+                rows = table.coin_slice(coin)
+                triggered += self._triggered(table, rows, np.full(rows.stop - rows.start, float(price)), now)
+            return triggered
+
+    def evaluate_many(self, prices, now=None):
+        """Alerts triggered by `prices` (price key -> price), every alert compared in one vectorized pass."""
+        now = time.time() if now is None else now
+        with self.lock:
+            for coin, price in prices.items():
+                self.history.record(coin, price, now)
+            triggered = []
+            for table in self._tables():
+                price_vector = np.array([prices.get(coin, np.nan) for coin in table.coins], np.float64)
+                triggered += self._triggered(table, slice(None), price_vector[table.coin_codes], now)
+            return triggered
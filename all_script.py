@@ -1,13 +1,25 @@
-from binance_script import get_balance as binance_balance, client
-from gate_script import balance as gate_balance
-from wallet_script import balance_usdt as wallet_balance
+from binance_script import get_prices
+from connectors import aggregate, BinanceConnector, GateConnector, BitgetConnector, WalletConnector
+import asyncio
 import os
 import pandas as pd
 from datetime import datetime
+from history_store import HistoryStore
 
-filename = 'balance_vs_btc.csv'
-total_binance, usdt_idr_rate = binance_balance()
-total_gate = gate_balance
+# One price request covers every figure below
+get_prices().start_cycle(["USDTIDRT", "BTCUSDT", "MANTAUSDT", "ETHUSDT"])
+manta_bitget = 325
+balances = asyncio.run(aggregate([
+    BinanceConnector(),
+    GateConnector(),
+    WalletConnector(),
+    BitgetConnector(holdings={'MANTA': manta_bitget}),
+]))
+total_binance = balances['binance']['usdt']
+total_gate = balances['gate']['usdt']
+wallet_balance = balances['wallet']['usdt']
+total_bitget = balances['bitget']['usdt']
+usdt_idr_rate = get_prices().get("USDTIDRT")
 
 os.system('clear')
 print("=== BINANCE ===")
@@ -23,9 +35,6 @@ print(f"Total Asset in USDT: {format(wallet_balance, ',.0f')}")
 print(f"Total Asset in IDR: {format(wallet_balance * usdt_idr_rate, ',.0f')}")
 
 print("\n=== Bitget ===")
-manta_bitget = 325
-manta_price = client.ticker_price("MANTAUSDT")
-total_bitget = manta_bitget * float(manta_price['price'])
 print(f"Total Asset in USDT: {format(total_bitget, ',.0f')}")
 print(f"Total Asset in IDR: {format(total_bitget * usdt_idr_rate, ',.0f')}")
 
@@ -34,17 +43,14 @@ print("\n=== TOTAL ===")
 total_usdt = total_binance + total_gate + wallet_balance + total_bitget
 total_idr = total_usdt * usdt_idr_rate
 
-btc_price = client.ticker_price("BTCUSDT")['price']
-total_btc = total_usdt / float(btc_price)
+btc_price = get_prices().get("BTCUSDT")
+total_btc = total_usdt / btc_price
 print("BTC Price: ", btc_price)
 print(f"Total Asset in USDT: {format(total_usdt, ',.0f')}")
 print(f"Total Asset in IDR: {format(total_idr, ',.0f')}")
 print(f"Total Asset in BTC: {format(total_btc, ',.8f')}")
 
 
-# Check if the file exists
-file_exists = os.path.isfile(filename)
-
 df = pd.DataFrame({
     'Date': [datetime.now()],
     'BTC_Price': [btc_price],
@@ -56,5 +62,5 @@ df = pd.DataFrame({
     'Total_IDR': [total_idr]
 })
 
-# Append the DataFrame to the CSV file
-df.to_csv(filename, mode='a', header=not file_exists, index=False)
\ No newline at end of file
+# Append the row to the history store
+HistoryStore().append(df)
\ No newline at end of file
@@ -0,0 +1,246 @@
+import math
+import threading
+from collections import deque
+
+import numpy as np
+
+# Value columns of the history table that get analytics
+SERIES = ['Total_USDT', 'Total_BTC', 'Total_IDR', 'BTC_Price']
+
+HOUR = 3600
+DAY = 24 * HOUR
+YEAR = 365 * DAY
+# Windows up to this long are answered from hourly buckets, longer ones from daily
+HOURLY_KEEP = 30 * DAY
+MAX_WINDOW = 10 * YEAR
+
+
+def to_seconds(dates):
+    # Naive history dates -> float seconds; only differences and bucket edges matter
+    return np.asarray(dates, dtype='datetime64[ns]').astype(np.int64) / 1e9
+
+
+class Rollup:
+    """Open/high/low/close buckets of one series, `size` seconds each."""
+
+    def __init__(self, size, keep=None):
+        self.size = size
+        # [start, open, high, low, close]; the newest bucket is the only one still changing
+        self.buckets = deque(maxlen=keep)
+
+    def add(self, time, value):
+        start = time - time % self.size
+        if self.buckets and self.buckets[-1][0] == start:
+            bucket = self.buckets[-1]
+            bucket[2] = max(bucket[2], value)
+            bucket[3] = min(bucket[3], value)
+            bucket[4] = value
+        else:
+            self.buckets.append([start, value, value, value, value])
+
+    def extend(self, times, values):
+        # Vectorized equivalent of add() over sorted arrays
+        if not len(times):
+            return
+        starts = times - times % self.size
+        first = np.flatnonzero(np.r_[True, starts[1:] != starts[:-1]])
+        last = np.r_[first[1:] - 1, len(times) - 1]
+        columns = [starts[first], values[first], np.maximum.reduceat(values, first),
+                   np.minimum.reduceat(values, first), values[last]]
+        self.buckets.extend([list(row) for row in zip(*(column.tolist() for column in columns))])
+
+    def since(self, start):
+        # Buckets ending after `start`, oldest first
+        selected = []
+        for bucket in reversed(self.buckets):
+            if bucket[0] + self.size <= start:
+                break
+            selected.append(bucket)
+        return selected[::-1]
+
+
+class SeriesStats:
+    """Running aggregates of one value series, updated in O(1) per row.
+
+    Keeps the running peak and worst drawdown, Welford's mean and variance
+    of row-to-row returns, and hourly and daily rollups for windowed stats.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.first_time = self.last_time = None
+        self.first = self.last = None
+        self.peak = -math.inf
+        self.max_drawdown = 0.0
+        # Welford state over simple returns
+        self.returns = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.hourly = Rollup(HOUR, keep=HOURLY_KEEP // HOUR + 1)
+        self.daily = Rollup(DAY)
+
+    def add(self, time, value):
+        if self.count == 0:
+            self.first_time, self.first = time, value
+        elif self.last > 0:
+            change = value / self.last - 1
+            self.returns += 1
+            delta = change - self.mean
+            self.mean += delta / self.returns
+            self.m2 += delta * (change - self.mean)
+        self.count += 1
+        self.last_time, self.last = time, value
+
+        self.peak = max(self.peak, value)
+        if self.peak > 0:
+            self.max_drawdown = min(self.max_drawdown, value / self.peak - 1)
+        self.hourly.add(time, value)
+        self.daily.add(time, value)
+
+    @classmethod
+    def from_arrays(cls, times, values):
+        """The state add() would reach over every row, computed in one vectorized pass."""
+        stats = cls()
+        if not len(values):
+            return stats
+        stats.count = len(values)
+        stats.first_time, stats.last_time = float(times[0]), float(times[-1])
+        stats.first, stats.last = float(values[0]), float(values[-1])
+
+        peaks = np.maximum.accumulate(values)
+        stats.peak = float(peaks[-1])
+        positive = peaks > 0
+        if positive.any():
+            stats.max_drawdown = min(float((values[positive] / peaks[positive] - 1).min()), 0.0)
+
+        previous = values[:-1]
+        changes = values[1:][previous > 0] / previous[previous > 0] - 1
+        stats.returns = len(changes)
+        if stats.returns:
+            stats.mean = float(changes.mean())
+            stats.m2 = float(((changes - stats.mean) ** 2).sum())
+
+        stats.hourly.extend(times, values)
+        stats.daily.extend(times, values)
+        return stats
+
+    def volatility(self):
+        # Annualized, scaled by the average spacing of the rows
+        if self.returns < 2:
+            return math.nan
+        spacing = (self.last_time - self.first_time) / (self.count - 1)
+        return math.sqrt(self.m2 / (self.returns - 1) * YEAR / spacing) if spacing > 0 else math.nan
+
+    def summary(self, window=None):
+        """{'start', 'end', 'change', 'max_drawdown', 'volatility'} over the last `window` seconds, or everything."""
+        if self.count == 0:
+            return None
+        if window is None:
+            return {'start': self.first, 'end': self.last, 'change': change(self.first, self.last),
+                    'max_drawdown': self.max_drawdown, 'volatility': self.volatility()}
+
+        rollup = self.hourly if window <= HOURLY_KEEP else self.daily
+        buckets = np.array(rollup.since(self.last_time - window), dtype=float).reshape(-1, 5)
+        _, opens, highs, lows, closes = buckets.T
+        # A bucket's low only counts against highs known to come before it: the
+        # earlier buckets' and its own open, so intra-bucket order never overstates it
+        peaks = np.maximum(np.r_[-np.inf, np.maximum.accumulate(highs)[:-1]], opens)
+        drawdowns = np.where(peaks > 0, lows / np.where(peaks > 0, peaks, 1) - 1, 0)
+        returns = np.diff(np.log(closes[closes > 0]))
+        volatility = float(returns.std(ddof=1)) * math.sqrt(YEAR / rollup.size) if len(returns) > 1 else math.nan
+        return {'start': float(opens[0]), 'end': self.last, 'change': change(float(opens[0]), self.last),
+                'max_drawdown': min(float(drawdowns.min()), 0.0), 'volatility': volatility}
+
+
+def change(start, end):
+    return end / start - 1 if start else math.nan
+
+
+class PortfolioAnalytics:
+    """SeriesStats for each value column of a history table."""
+
+    def __init__(self, columns=SERIES):
+        self.columns = columns
+        self.series = {column: SeriesStats() for column in columns}
+        self.rows = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, frame, columns=SERIES):
+        """Rebuild from a HistoryStore.range() frame (Date index, sorted)."""
+        analytics = cls(columns)
+        times = to_seconds(frame.index.values)
+        for column in columns:
+            if column not in frame:
+                continue
+            values = frame[column].to_numpy(dtype=float)
+            present = ~np.isnan(values)
+            analytics.series[column] = SeriesStats.from_arrays(times[present], values[present])
+        analytics.rows = len(frame)
+        return analytics
+
+    def update(self, df):
+        """Fold in new history rows (a frame with a Date column, as passed to HistoryStore.append)."""
+        import pandas as pd
+
+        times = to_seconds(pd.to_datetime(df['Date'], format='mixed').values).tolist()
+        columns = [column for column in self.series if column in df]
+        values = df[columns].to_numpy(dtype=float).tolist()
+        with self.lock:
+            for time, row in zip(times, values):
+                for column, value in zip(columns, row):
+                    stats = self.series[column]
+                    # Rows older than the newest one were already counted by a rebuild
+                    if not math.isnan(value) and (stats.last_time is None or time > stats.last_time):
+                        stats.add(time, value)
+                self.rows += 1
+
+    def report(self, window=None):
+        """column -> summary over the window; columns without data are left out."""
+        with self.lock:
+            summaries = {column: stats.summary(window) for column, stats in self.series.items()}
+        return {column: summary for column, summary in summaries.items() if summary is not None}
+
+
+class HistoryAnalytics:
+    """A HistoryStore plus its analytics, kept in step with the stored rows.
+
+    The analytics are rebuilt from the stored history on first use. After
+    that every append and every read folds in the rows stored since the
+    newest one seen, so rows other processes wrote to the same table (tenant
+    shard workers) are counted too.
+    """
+
+    def __init__(self, history, columns=SERIES):
+        self.history = history
+        self.columns = columns
+        self.analytics = None
+        # Date of the newest stored row folded in
+        self.seen = None
+        self.lock = threading.Lock()
+
+    def _catch_up(self):
+        # Called with the lock held; one indexed range query, usually returning a row or none
+        frame = self.history.range(start_date=self.seen)
+        if self.seen is not None:
+            frame = frame[frame.index > self.seen]
+        if self.analytics is None:
+            self.analytics = PortfolioAnalytics.from_frame(frame, self.columns)
+        elif len(frame):
+            self.analytics.update(frame.reset_index())
+        if len(frame):
+            self.seen = frame.index[-1]
+
+    def append(self, df):
+        with self.lock:
+            self.history.append(df)
+            if self.analytics is not None:
+                self._catch_up()
+
+    def get(self):
+        with self.lock:
+            self._catch_up()
+            return self.analytics
+
+    def report(self, window=None):
+        return self.get().report(window)
@@ -3,11 +3,15 @@
 # Navigate to your repository
 cd $HOME/CryptoChecker
 
+# Recent rows may still be in history.db-wal, which isn't committed; fold
+# them into history.db first, and skip this push if that fails
+python3 history_store.py --checkpoint || exit 1
+
 # Add all changes to staging
-git add balance_vs_btc.csv
+git add history.db
 
 # Commit changes
-git commit -m "Auto push balance_vs_btc.csv"
+git commit -m "Auto push history.db"
 
 # Push changes to GitHub
 git push origin master
@@ -0,0 +1,215 @@
+import argparse
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from cost_basis import holdings_over_time
+from metrics import metrics
+
+# History rows are naive local times (datetime.now()), klines are UTC epochs
+LOCAL_TZ = datetime.now().astimezone().tzinfo
+
+KLINE_DIR = 'klines'
+KLINE_LIMIT = 1000
+INTERVAL_MS = {
+    '1m': 60_000,
+    '5m': 300_000,
+    '15m': 900_000,
+    '1h': 3_600_000,
+    '4h': 14_400_000,
+    '1d': 86_400_000,
+}
+
+
+class KlineCache:
+    """Close prices per symbol and interval, cached as compact .npz columns.
+
+    Only the part of the requested range not on disk yet is downloaded.
+    Candles still open are never stored, so they are fetched again once closed.
+    """
+
+    def __init__(self, client, directory=KLINE_DIR):
+        self.client = client
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, symbol, interval):
+        return os.path.join(self.directory, f"{symbol}_{interval}.npz")
+
+    def _load(self, symbol, interval):
+        try:
+            with np.load(self._path(symbol, interval)) as data:
+                return data['open_time'], data['close']
+        except FileNotFoundError:
+            return np.empty(0, np.int64), np.empty(0, np.float64)
+
+    def _download(self, symbol, interval, start, end):
+        now = int(time.time() * 1000)
+        open_times, closes = [], []
+        while start < end:
+            rows = self.client.klines(symbol, interval, startTime=start, endTime=end, limit=KLINE_LIMIT)
+            if not rows:
+                break
+            # row[6] is the close time; the current candle's close is still moving
+            closed = [row for row in rows if row[6] < now]
+            open_times += [row[0] for row in closed]
+            closes += [float(row[4]) for row in closed]
+            start = rows[-1][0] + INTERVAL_MS[interval]
+        return np.array(open_times, np.int64), np.array(closes, np.float64)
+
+    def get(self, symbol, interval, start, end):
+        open_time, close = self._load(symbol, interval)
+        step = INTERVAL_MS[interval]
+
+        chunks = [(open_time, close)]
+        if len(open_time) == 0:
+            chunks.append(self._download(symbol, interval, start, end))
+        else:
+            if start < open_time[0]:
+                chunks.append(self._download(symbol, interval, start, int(open_time[0]) - 1))
+            if end > open_time[-1] + step:
+                chunks.append(self._download(symbol, interval, int(open_time[-1]) + step, end))
+
+        if len(chunks) > 1:
+            open_time = np.concatenate([c[0] for c in chunks])
+            close = np.concatenate([c[1] for c in chunks])
+            open_time, unique = np.unique(open_time, return_index=True)
+            close = close[unique]
+            np.savez_compressed(self._path(symbol, interval), open_time=open_time, close=close)
+
+        mask = (open_time >= start) & (open_time <= end)
+        return open_time[mask], close[mask]
+
+
+def align(times, values, grid, fill=0.0):
+    # Last known value at or before each grid time
+    idx = np.searchsorted(times, grid, side='right') - 1
+    return np.where(idx >= 0, values[np.clip(idx, 0, None)], fill)
+
+
+def holdings_matrix(holdings, assets, grid):
+    """Quantity held of each asset at each grid time: shape (len(grid), len(assets))."""
+    if not assets:
+        return np.empty((len(grid), 0))
+    return np.column_stack([align(*holdings[asset], grid) for asset in assets])
+
+
+def price_matrix(klines, symbols, grid, start, end, interval):
+    columns = []
+    for symbol in symbols:
+        try:
+            open_time, close = klines.get(symbol, interval, start, end)
+        except Exception as e:
+            # Delisted or never listed against USDT: valued at zero
+            metrics.error('backfill.klines', e)
+            open_time, close = np.empty(0, np.int64), np.empty(0, np.float64)
+        columns.append(align(open_time, close, grid))
+    return np.column_stack(columns) if columns else np.empty((len(grid), 0))
+
+
+def to_epoch_ms(index):
+    return index.tz_localize(LOCAL_TZ).tz_convert('UTC').as_unit('ms').asi8
+
+
+def from_epoch_ms(ms):
+    return pd.to_datetime(ms, unit='ms', utc=True).tz_convert(LOCAL_TZ).tz_localize(None)
+
+
+def nearest_rows(existing_ms, points):
+    # Index of the real row closest in time to each point
+    after = np.clip(np.searchsorted(existing_ms, points), 0, len(existing_ms) - 1)
+    before = np.clip(after - 1, 0, None)
+    return np.where(np.abs(points - existing_ms[before]) <= np.abs(existing_ms[after] - points), before, after)
+
+
+def backfill(trades, klines, history, start, end, interval='1h'):
+    """Value trade-derived Binance holdings on an `interval` grid and fill history gaps.
+
+    Holdings are rebuilt from spot trades only, so cash, deposits,
+    withdrawals and earn products are not in them. Each filled row
+    therefore adds what the nearest real row had on top of its own
+    trade-derived value (Binance_USDT minus that row's derived value), and
+    Gate and other venues carry that row's values. The grid stops at the
+    last real row, so the latest row is always a real one; without any
+    real rows there is nothing to anchor to and nothing is filled.
+    Grid points within one interval of an existing row are skipped.
+    """
+    step = INTERVAL_MS[interval]
+    existing = history.range()
+    if existing.empty:
+        return existing.reset_index().iloc[0:0]
+    existing_ms = to_epoch_ms(existing.index)
+
+    end = min(end, int(existing_ms[-1]))
+    grid = np.arange(start - start % step, end, step, dtype=np.int64)
+    # Real rows inside the range get the same trade-derived valuation, for the offset
+    real = np.flatnonzero((existing_ms >= start) & (existing_ms <= end))
+    points = np.concatenate([grid, existing_ms[real]])
+
+    holdings = holdings_over_time(trades)
+    assets = sorted(holdings)
+    held = holdings_matrix(holdings, assets, points)
+    prices = price_matrix(klines, [asset + 'USDT' for asset in assets], points, start, end, interval)
+    derived = (held * prices).sum(axis=1)
+    derived_grid, derived_real = derived[:len(grid)], derived[len(grid):]
+
+    btc = price_matrix(klines, ['BTCUSDT'], grid, start, end, interval)[:, 0]
+    idr = price_matrix(klines, ['USDTIDRT'], grid, start, end, interval)[:, 0]
+
+    nearest = nearest_rows(existing_ms, grid)
+    gap = (np.abs(existing_ms[nearest] - grid) > step) & (btc > 0)
+
+    # What the derived value misses, per real row; rows outside the range have
+    # no derived value and fall back to the nearest real row inside it
+    offsets = np.full(len(existing_ms), np.nan)
+    offsets[real] = existing['Binance_USDT'].to_numpy()[real] - derived_real
+    anchor = real[nearest_rows(existing_ms[real], grid)] if len(real) else nearest
+    offset = np.nan_to_num(offsets[anchor])
+
+    binance_usdt = derived_grid + offset
+    gate = existing['Gate_USDT'].to_numpy()[nearest]
+    other = existing['Other_USDT'].to_numpy()[nearest]
+    total_usdt = binance_usdt + gate + other
+
+    df = pd.DataFrame({
+        'Date': from_epoch_ms(grid),
+        'BTC_Price': btc,
+        'Binance_USDT': binance_usdt,
+        'Gate_USDT': gate,
+        'Other_USDT': other,
+        'Total_BTC': np.divide(total_usdt, btc, out=np.zeros_like(total_usdt), where=btc > 0),
+        'Total_USDT': total_usdt,
+        'Total_IDR': total_usdt * idr,
+    })[gap]
+    return df
+
+
+def main():
+    from binance_script import get_client, get_trade_store
+    from history_store import HistoryStore
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--start', required=True)
+    parser.add_argument('--end', default=None)
+    parser.add_argument('--interval', default='1h', choices=list(INTERVAL_MS))
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    start = int(to_epoch_ms(pd.DatetimeIndex([args.start]))[0])
+    end = int(to_epoch_ms(pd.DatetimeIndex([args.end]))[0]) if args.end else int(time.time() * 1000)
+
+    history = HistoryStore()
+    started = time.perf_counter()
+    df = backfill(get_trade_store().load_frame(), KlineCache(get_client()), history, start, end, args.interval)
+    print(f"{len(df)} rows to fill in {time.perf_counter() - started:.2f}s")
+
+    if not args.dry_run:
+        history.append(df)
+
+
+if __name__ == '__main__':
+    # python3 backfill.py --start 2024-01-01 --interval 1h
+    main()
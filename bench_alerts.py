@@ -0,0 +1,97 @@
+import argparse
+import operator
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from alert_engine import AlertEngine, COMPARISONS, CROSS, MOVE, is_one_shot
+
+COMPARE = {'<': operator.lt, '>': operator.gt, '<=': operator.le, '>=': operator.ge, '==': operator.eq}
+
+
+def make_engine(directory, alerts, coins, seed=0):
+    # Written as one CSV snapshot; adding 100k alerts one by one would journal each
+    rng = np.random.default_rng(seed)
+    kinds = rng.choice(COMPARISONS[:4] + [MOVE, CROSS], size=alerts, p=[0.2, 0.2, 0.15, 0.15, 0.15, 0.15])
+    coin_ids = rng.integers(0, coins, size=alerts)
+    path = os.path.join(directory, 'alerts.csv')
+    with open(path, 'w') as file:
+        file.write('id,chat_id,coin,operator,price,param\n')
+        for i, (kind, coin) in enumerate(zip(kinds, coin_ids)):
+            if kind == MOVE:
+                price, param = rng.uniform(2, 10), rng.choice([900, 3600, 86400])
+            elif kind == CROSS:
+                price, param = 100 * rng.uniform(0.9, 1.1), 0.5
+            else:
+                # Mostly beyond the current price, like real alerts
+                price, param = 100 * rng.uniform(0.9, 1.5) if kind in ('>', '>=') else 100 * rng.uniform(0.5, 1.1), 0
+            file.write(f"{i + 1},{i % 1000},COIN{coin},{kind},{price:.4f},{param}\n")
+    return AlertEngine(path, os.path.join(directory, 'alerts.journal'), compact_every=10**9)
+
+
+def loop_evaluate(alerts, prices):
+    # What check_alerts used to do: one Python comparison per alert row
+    return [alert for alert in alerts if alert.operator in COMPARE and alert.coin in prices
+            and COMPARE[alert.operator](prices[alert.coin], alert.price)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--alerts', type=int, default=100_000)
+    parser.add_argument('--coins', type=int, default=500)
+    parser.add_argument('--ticks', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(directory, args.alerts, args.coins)
+        coins = [f"COIN{i}" for i in range(args.coins)]
+        alerts = list(engine.alerts.values())
+
+        start = time.perf_counter()
+        engine.recompile()
+        compile_time = time.perf_counter() - start
+
+        # A random walk around 100, one tick a minute so move windows fill up
+        levels = np.full(args.coins, 100.0)
+        batch, single, added, loop, fired = [], [], [], [], 0
+        for tick in range(args.ticks):
+            levels *= rng.normal(1, 0.002, size=args.coins)
+            prices = dict(zip(coins, levels.tolist()))
+            now = tick * 60.0
+
+            start = time.perf_counter()
+            triggered = engine.evaluate_many(prices, now=now)
+            batch.append(time.perf_counter() - start)
+            fired += len(triggered)
+            # As the bot does once the notifications are out
+            engine.remove([alert.id for alert in triggered if is_one_shot(alert)])
+
+            start = time.perf_counter()
+            engine.evaluate(coins[tick % args.coins], prices[coins[tick % args.coins]], now=now)
+            single.append(time.perf_counter() - start)
+
+            # A user adding an alert, then the next tick on that coin: no recompile in between
+            coin = coins[(tick * 7) % args.coins]
+            start = time.perf_counter()
+            engine.add(tick % 1000, coin, '>', prices[coin] * 2)
+            engine.evaluate(coin, prices[coin], now=now)
+            added.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            loop_evaluate(alerts, prices)
+            loop.append(time.perf_counter() - start)
+
+    ms = lambda times: statistics.median(times) * 1000
+    print(f"{args.alerts} alerts on {args.coins} coins, {args.ticks} ticks, compile {compile_time * 1000:.1f}ms")
+    print(f"batch  (all kinds)   p50 {ms(batch):8.2f}ms  max {max(batch) * 1000:8.2f}ms  fired {fired}")
+    print(f"single coin tick     p50 {ms(single):8.2f}ms")
+    print(f"add + coin tick      p50 {ms(added):8.2f}ms  max {max(added) * 1000:8.2f}ms")
+    print(f"row loop (compare)   p50 {ms(loop):8.2f}ms  ({ms(loop) / ms(batch):.1f}x slower, comparisons only)")
+
+
+if __name__ == '__main__':
+    main()
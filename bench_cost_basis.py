@@ -0,0 +1,93 @@
+import argparse
+import time
+
+import numpy as np
+
+from cost_basis import apply_trades, average_cost, average_cost_loop, fifo_cost, trades_to_frame
+
+
+def make_trades(n, symbols=10, seed=0):
+    rng = np.random.default_rng(seed)
+    bases = [f"COIN{i}" for i in range(symbols)]
+    quotes = rng.choice(['USDT', 'FDUSD'], size=n)
+    assets = rng.integers(0, symbols, size=n)
+    prices = rng.uniform(0.1, 100, size=n)
+    qtys = rng.uniform(0.01, 10, size=n)
+    buys = rng.random(n) < 0.6
+
+    # Binance returns price/qty as strings, so the benchmark does too
+    return [
+        {'symbol': bases[a] + q, 'id': i, 'time': i, 'price': f"{p:.8f}", 'qty': f"{x:.8f}", 'isBuyer': bool(b)}
+        for i, (a, q, p, x, b) in enumerate(zip(assets, quotes, prices, qtys, buys))
+    ]
+
+
+def make_closeouts(sequences=300, n=200, seed=1):
+    # Quantities on a 0.1 grid, so positions regularly close out exactly and
+    # float sums land on +-1e-17 instead of zero
+    rng = np.random.default_rng(seed)
+    for s in range(sequences):
+        qtys = rng.integers(1, 20, size=n) / 10
+        buys = rng.random(n) < 0.5
+        prices = rng.uniform(1, 100, size=n)
+        yield [{'symbol': 'COINUSDT', 'id': i, 'time': i, 'price': f"{p:.8f}", 'qty': f"{q:.8f}", 'isBuyer': bool(b)}
+               for i, (p, q, b) in enumerate(zip(prices, qtys, buys))]
+
+
+def check_closeouts():
+    """Loop, vectorized and chunked incremental basis must agree on exact close-outs."""
+    for trades in make_closeouts():
+        expected = average_cost_loop(trades)
+        result = average_cost(trades_to_frame(trades)).loc['COIN']
+        state = (0, 0)
+        for start in range(0, len(trades), 37):
+            state = apply_trades(*state, trades[start:start + 37])
+        for total_cost, total_qty in [(result['total_cost'], result['total_qty']), state]:
+            assert np.isclose(total_qty, expected[1], atol=1e-9), (total_qty, expected)
+            assert np.isclose(total_cost, expected[0], rtol=1e-9, atol=1e-6), (total_cost, expected)
+    print("close-out sequences: loop, vectorized and incremental agree")
+
+
+def loop_all(trades):
+    # What calculate_asset used to do: one replay per asset
+    by_asset = {}
+    for trade in trades:
+        by_asset.setdefault(trade['symbol'].replace('FDUSD', '').replace('USDT', ''), []).append(trade)
+    return {asset: average_cost_loop(asset_trades) for asset, asset_trades in by_asset.items()}
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000')
+    parser.add_argument('--symbols', type=int, default=10)
+    args = parser.parse_args()
+
+    # 'parse' is the one-off string parsing of raw API trades; trades read back
+    # from the TradeStore are already numeric, so 'core' is the steady state
+    check_closeouts()
+    print(f"{'rows':>10} {'loop':>10} {'parse':>10} {'average':>10} {'fifo':>10} {'core':>8} {'total':>8}")
+    for n in [int(x) for x in args.sizes.split(',')]:
+        trades = make_trades(n, args.symbols)
+
+        expected, loop_time = timed(loop_all, trades)
+        frame, parse_time = timed(trades_to_frame, trades)
+        result, avg_time = timed(average_cost, frame)
+        _, fifo_time = timed(fifo_cost, frame)
+
+        for asset, (total_cost, total_qty) in expected.items():
+            assert np.isclose(result.loc[asset, 'total_qty'], total_qty, atol=1e-6)
+            assert np.isclose(result.loc[asset, 'total_cost'], total_cost, rtol=1e-6, atol=1e-4)
+
+        core = loop_time / avg_time
+        total = loop_time / (parse_time + avg_time)
+        print(f"{n:>10} {loop_time:>9.3f}s {parse_time:>9.3f}s {avg_time:>9.3f}s {fifo_time:>9.3f}s {core:>7.1f}x {total:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
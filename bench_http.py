@@ -0,0 +1,71 @@
+import argparse
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from http_session import new_session
+
+# Roughly the requests of one refresh: balance, account, prices, gate, wallet
+CYCLE_PATHS = ['/sapi/v1/asset/wallet/balance', '/api/v3/account', '/api/v3/ticker/price',
+               '/api/v4/wallet/total_balance', '/rpc', '/api/v3/ticker/price']
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    handshake_delay = 0.05
+
+    def setup(self):
+        # Stands in for the TCP + TLS handshake a fresh connection pays
+        time.sleep(self.handshake_delay)
+        super().setup()
+
+    def do_GET(self):
+        body = b'{"price": "1.0"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run_cycle(get, base_url):
+    start = time.perf_counter()
+    for path in CYCLE_PATHS:
+        get(base_url + path).raise_for_status()
+    return time.perf_counter() - start
+
+
+def report(name, times):
+    print(f"{name:<10} p50 {statistics.median(times) * 1000:7.1f}ms  max {max(times) * 1000:7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cycles', type=int, default=20)
+    parser.add_argument('--handshake-ms', type=float, default=50)
+    args = parser.parse_args()
+
+    StubHandler.handshake_delay = args.handshake_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    # Before: every request opens its own connection
+    report('fresh', [run_cycle(requests.get, base_url) for _ in range(args.cycles)])
+
+    # After: one pooled keep-alive session reused across cycles
+    session = new_session()
+    report('pooled', [run_cycle(session.get, base_url) for _ in range(args.cycles)])
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import argparse
+import statistics
+import subprocess
+import sys
+
+MODULES = ['binance_script', 'gate_script', 'wallet_script', 'telegram_bot']
+
+# Runs in a fresh interpreter: any socket connect during import is recorded
+PROBE = '''
+import socket, sys, time
+connects = []
+connect = socket.socket.connect
+def record(self, address):
+    connects.append(address)
+    return connect(self, address)
+socket.socket.connect = record
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start, len(connects), len(sys.modules))
+'''
+
+
+def measure(module):
+    result = subprocess.run([sys.executable, '-c', PROBE.format(module=module)], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    seconds, connects, loaded = result.stdout.split()
+    return float(seconds), int(connects), int(loaded)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    args = parser.parse_args()
+
+    print(f"{'module':<16} {'median':>9} {'max':>9} {'sockets':>8} {'modules':>8}")
+    for module in args.modules:
+        runs = [measure(module) for _ in range(args.runs)]
+        if None in runs:
+            print(f"{module:<16} {'import failed':>9}")
+            continue
+        times = [r[0] for r in runs]
+        print(f"{module:<16} {statistics.median(times):>8.3f}s {max(times):>8.3f}s {runs[-1][1]:>8} {runs[-1][2]:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import resource
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from fake_exchange import FakeExchange, serve
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id, text):
+        self.sent += 1
+
+
+class FakeMessage:
+    def __init__(self, chat_id=0, text='/chart'):
+        self.chat_id = chat_id
+        self.text = text
+        self.replies = 0
+
+    async def reply_text(self, text):
+        self.replies += 1
+
+    async def reply_photo(self, photo, caption=None):
+        self.replies += 1
+
+
+def fake_update():
+    return SimpleNamespace(message=FakeMessage(), effective_user=SimpleNamespace(username='bench', id=0))
+
+
+def percentile(times, q):
+    times = sorted(times)
+    return times[min(len(times) - 1, int(round(q * (len(times) - 1))))]
+
+
+def write_alerts(path, count, exchange, seed=0):
+    # Thresholds mostly sit beyond the current price, so only a few percent fire
+    rng = random.Random(seed)
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['id', 'chat_id', 'coin', 'operator', 'price'])
+        for i in range(count):
+            asset = rng.choice(exchange.assets)
+            operator = rng.choice(['<', '>'])
+            factor = rng.uniform(0.99, 1.5) if operator == '>' else rng.uniform(0.5, 1.01)
+            price = exchange.prices[f"{asset}USDT"] * factor
+            writer.writerow([i + 1, rng.randrange(100), asset, operator, round(price, 4)])
+
+
+def write_wallets(path, base_url, addresses):
+    # Two chains on the fake node, each with a stablecoin and a priced token
+    chains = {name: {'rpc': f"{base_url}/rpc/{name}", 'native': 'ETH'} for name in ('optimism', 'arbitrum')}
+    tokens = [{'chain': name, 'symbol': symbol, 'address': '0x' + f'{i:040x}', 'decimals': 6}
+              for name in chains for i, symbol in enumerate(['USDC', 'COIN0'])]
+    addresses = ['0x' + f'{i + 1:040x}' for i in range(addresses)]
+    with open(path, 'w') as file:
+        json.dump({'chains': chains, 'addresses': addresses, 'tokens': tokens}, file)
+
+
+def write_history(history, rows):
+    import numpy as np
+    import pandas as pd
+
+    end = datetime.now() - timedelta(minutes=1)
+    dates = pd.date_range(end=end, periods=rows, freq='3min')
+    values = np.random.default_rng(0).uniform(1000, 2000, size=(rows, len(history.columns)))
+    df = pd.DataFrame(values, columns=history.columns)
+    df.insert(0, 'Date', dates)
+    history.append(df)
+
+
+class Phase:
+    def __init__(self, name, exchange):
+        self.name = name
+        self.exchange = exchange
+        self.times = []
+        self.requests = 0
+        self.peak_memory = 0
+
+    async def run(self, func, iterations):
+        self.exchange.reset_counts()
+        for _ in range(iterations):
+            start = time.perf_counter()
+            await func()
+            self.times.append(time.perf_counter() - start)
+        self.requests = sum(self.exchange.requests.values())
+
+        # One extra traced run; tracing slows everything down, so it isn't timed
+        tracemalloc.start()
+        await func()
+        self.peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    def report(self):
+        ms = [t * 1000 for t in self.times]
+        print(f"{self.name:<10} first {ms[0]:8.1f}ms  p50 {statistics.median(ms):8.1f}ms  p95 {percentile(ms, 0.95):8.1f}ms"
+              f"  req/iter {self.requests / len(ms):6.1f}  peak {self.peak_memory / 2**20:6.1f}MiB")
+
+
+async def run(args, exchange):
+    # Imported only now so the configs pick up the fake exchange hosts
+    import binance_script
+    import telegram_bot
+    from request_scheduler import scheduler
+    from metrics import metrics
+
+    telegram_bot.init_services()
+    write_history(telegram_bot.history, args.history_rows)
+    bot = FakeBot()
+    context = SimpleNamespace(bot=bot, args=[], application=SimpleNamespace(create_task=asyncio.ensure_future))
+
+    async def snapshot():
+        await telegram_bot.run_blocking(binance_script.take_snapshot)
+
+    async def update():
+        await telegram_bot.updateData(force=True)
+
+    async def alerts():
+        await telegram_bot.check_alerts(context)
+
+    async def chart():
+        # Bypass the whitelist check; the chart path itself is what's measured
+        await telegram_bot.sendChart.__wrapped__(fake_update(), context)
+
+    phases = [Phase('snapshot', exchange), Phase('update', exchange), Phase('alerts', exchange), Phase('chart', exchange)]
+    for phase, func in zip(phases, [snapshot, update, alerts, chart]):
+        await phase.run(func, args.iterations)
+
+    print(f"assets {args.assets}  trades/symbol {args.trades}  alerts {args.alerts}  history rows {args.history_rows}  wallets {args.wallets}"
+          f"  latency {args.latency_ms}ms  error rate {args.error_rate:.0%}")
+    for phase in phases:
+        phase.report()
+    # Notifications drain at the per-chat rate, outside the timed phases
+    await telegram_bot.notifier.join()
+    print(f"alert messages sent {bot.sent}  scheduler {scheduler.stats()}")
+    print()
+    for name, count, p50, p95, slowest in metrics.summary():
+        print(f"  {name:<16} n {count:5d}  p50 {p50 * 1000:8.1f}ms  p95 {p95 * 1000:8.1f}ms  max {slowest * 1000:8.1f}ms")
+    for name, count in sorted(metrics.error_counts().items()):
+        print(f"  error {name} {count}")
+    print(f"max rss {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f}MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--assets', type=int, default=20)
+    parser.add_argument('--trades', type=int, default=500, help='trades per symbol')
+    parser.add_argument('--alerts', type=int, default=1000)
+    parser.add_argument('--history-rows', type=int, default=10000)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--wallets', type=int, default=10, help='wallet addresses scanned on each of two chains')
+    args = parser.parse_args()
+
+    exchange = FakeExchange(args.assets, args.trades, args.latency_ms, args.error_rate)
+    server, base_url = serve(exchange)
+    os.environ.update({
+        'BINANCE_BASE_URL': base_url,
+        'GATE_HOST': base_url + '/api/v4',
+        'BINANCE_API_KEY': 'bench',
+        'BINANCE_SECRET': 'bench',
+        'GATE_API_KEY': 'bench',
+        'GATE_SECRET': 'bench',
+        # Every update must hit the fake exchange, never the snapshot cache
+        'SNAPSHOT_TTL': '0',
+    })
+
+    # trades.db, history.db and alerts live in a scratch directory
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        write_alerts('alerts.csv', args.alerts, exchange)
+        write_wallets('wallets.json', base_url, args.wallets)
+        asyncio.run(run(args, exchange))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    # python3 bench_load.py --assets 100 --trades 2000 --alerts 10000 --latency-ms 50
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+
+from alert_engine import is_one_shot
+from bench_alerts import make_engine
+from fake_stream import ReplayStream, read_ticks, synthetic_ticks
+from metrics import metrics
+from price_stream import PriceStream
+
+
+async def run(args, engine, ticks):
+    rng = random.Random(1)
+    stream = ReplayStream(ticks, args.speed)
+    server, url = await stream.serve()
+
+    symbol_reads, tick_times, fired = 0, [], 0
+    received = asyncio.Event()
+
+    def get_symbols():
+        # What telegram_bot.watched_symbols does: every alert coin, under the engine lock
+        nonlocal symbol_reads
+        symbol_reads += 1
+        return {f"{coin}USDT" for coin in engine.coins()}
+
+    async def on_tick(symbol, price):
+        # What telegram_bot.trigger_alerts does, minus the notifications
+        nonlocal fired
+        start = time.perf_counter()
+        try:
+            if rng.random() < args.tick_error_rate:
+                raise RuntimeError('on_tick failed')
+            triggered = engine.evaluate(symbol[:-len('USDT')], price)
+            engine.remove([alert.id for alert in triggered if is_one_shot(alert)])
+            fired += len(triggered)
+        finally:
+            tick_times.append(time.perf_counter() - start)
+            if stream.finished.is_set() and len(tick_times) >= stream.sent:
+                received.set()
+
+    price_stream = PriceStream(None, get_symbols, on_tick, url=url, streams=('miniTicker',),
+                               resync_interval=args.resync_interval)
+    start = time.perf_counter()
+    task = asyncio.ensure_future(price_stream.run())
+    await stream.finished.wait()
+    if len(tick_times) < stream.sent:
+        await received.wait()
+    elapsed = time.perf_counter() - start
+    price_stream.stop()
+    task.cancel()
+    server.close()
+
+    ms = lambda times: statistics.median(times) * 1000
+    p99 = sorted(tick_times)[int(0.99 * (len(tick_times) - 1))] * 1000
+    print(f"{len(ticks)} ticks replayed, {len(tick_times)} handled in {elapsed:.2f}s ({len(tick_times) / elapsed:.0f}/s)")
+    print(f"on_tick              p50 {ms(tick_times):8.3f}ms  p99 {p99:8.3f}ms  fired {fired}")
+    print(f"symbol re-reads {symbol_reads}  connections {stream.connections}  requests {dict(stream.requests)}")
+    print(f"errors {metrics.error_counts()}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--alerts', type=int, default=10_000)
+    parser.add_argument('--coins', type=int, default=200)
+    parser.add_argument('--ticks', type=int, default=20_000)
+    # Replays a file written by fake_stream.py --record instead of a random walk
+    parser.add_argument('--ticks-file')
+    parser.add_argument('--speed', type=float, default=0, help='0 replays as fast as the client reads')
+    parser.add_argument('--resync-interval', type=float, default=5)
+    parser.add_argument('--tick-error-rate', type=float, default=0.01)
+    args = parser.parse_args()
+
+    if args.ticks_file:
+        ticks = read_ticks(args.ticks_file)
+    else:
+        ticks = synthetic_ticks({f"COIN{i}USDT": 100.0 for i in range(args.coins)}, args.ticks)
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(directory, args.alerts, args.coins)
+        asyncio.run(run(args, engine, ticks))
+
+
+if __name__ == '__main__':
+    main()
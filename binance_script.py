@@ -1,8 +1,14 @@
-import pandas as pd
-from binance.spot import Spot as Client
 from datetime import datetime
-from utils import format_currency, get_datetime_now
-from configs import BINANCE_API_KEY, BINANCE_SECRET
+from functools import lru_cache
+from utils import format_currency
+from configs import BINANCE_API_KEY, BINANCE_SECRET, BINANCE_BASE_URL, HTTP_TIMEOUT, HTTP_POOL_SIZE
+from trade_store import TradeStore, sync_asset
+from price_service import PriceService
+from request_scheduler import ScheduledClient, scheduler
+from http_session import tune_session
+from terminal import DiffRenderer
+from snapshot import PortfolioSnapshot, asset_record
+from metrics import metrics
 import time
 import os
 import json
@@ -10,162 +16,176 @@ import sys
 import time
 import argparse
 
-pd.options.display.float_format = '{:.5f}'.format
-pd.set_option('display.max_columns', None)
-pd.set_option('display.expand_frame_repr', False)
-pd.set_option('display.precision', 2)
-
-client = Client(BINANCE_API_KEY, BINANCE_SECRET)
-
-# Get USDT/IDR exchange rate
-usdt_idr_ticker = client.ticker_price("USDTIDRT")
-USDT_IDR_RATE = float(usdt_idr_ticker['price'])
-
-# GLOBAL VARIABLE
-LAST_UPDATED = get_datetime_now()
-BALANCE_DICT = {}
-SPOT_ASSET = ['BTCUSDT']
-PRICE_DICT = {}
-ACCOUNT_INFO = None
-BALANCE = None
-TOTAL_ASSET_IN_BTC, TOTAL_ASSET_IN_USDT, TOTAL_PROFIT_LOSS, TOTAL_SPOT_VALUE = 0, 0, 0, 0
-
-
-def get_balance():
-    global BALANCE_DICT, BALANCE, TOTAL_ASSET_IN_USDT, TOTAL_SPOT_VALUE, TOTAL_ASSET_IN_BTC
-    usdt_idr_ticker = client.ticker_price("USDTIDRT")
-    USDT_IDR_RATE = float(usdt_idr_ticker['price'])
-    BALANCE = client.balance()
-    BALANCE_DICT = {item['walletName']: float(item['balance']) for item in BALANCE}
-
-    prices = client.ticker_price(symbols=SPOT_ASSET)
-    PRICE_DICT = {item['symbol']: float(item['price']) for item in prices}
-    
-    TOTAL_SPOT_VALUE = BALANCE_DICT.get('Spot', 0) * PRICE_DICT.get('BTCUSDT', 0)
-    TOTAL_ASSET_IN_BTC = sum([float(x['balance']) for x in BALANCE if float(x['balance']) > 0])
-    TOTAL_ASSET_IN_USDT = TOTAL_ASSET_IN_BTC * float(PRICE_DICT.get('BTCUSDT', 0))
-    
-    return TOTAL_ASSET_IN_USDT, USDT_IDR_RATE
-
-
-def get_spot_asset():
-    global SPOT_ASSET, ACCOUNT_INFO
-    ACCOUNT_INFO = client.account()
-    exclusion1 = ['USDT','ETHFI', 'FDUSDT']
-    exclusion1 += ['LD' + x for x in exclusion1]
-    exclusion2 = ['LD' + x['asset'] for x in ACCOUNT_INFO['balances']]
+# Nothing here touches the network or disk at import time; the client,
+# price table and trade store are built on first use.
+@lru_cache(maxsize=None)
+def get_client(api_key=BINANCE_API_KEY, secret=BINANCE_SECRET, pool_size=HTTP_POOL_SIZE):
+    from binance.spot import Spot as Client
+    # Spot only falls back to its default host when base_url is not passed at all
+    options = {'base_url': BINANCE_BASE_URL} if BINANCE_BASE_URL else {}
+    client = Client(api_key, secret, timeout=HTTP_TIMEOUT, **options)
+    # Keep-alive pool sized for the fetcher threads, reused across refreshes
+    tune_session(client.session, pool_size)
+    # Every call is paced against the shared request-weight budget
+    return ScheduledClient(client, scheduler)
+
+@lru_cache(maxsize=None)
+def get_prices():
+    return PriceService(get_client())
+
+@lru_cache(maxsize=None)
+def get_trade_store():
+    return TradeStore()
+
+def setup_pandas():
+    import pandas as pd
+    pd.options.display.float_format = '{:.5f}'.format
+    pd.set_option('display.max_columns', None)
+    pd.set_option('display.expand_frame_repr', False)
+    pd.set_option('display.precision', 2)
+
+EXCLUDED_ASSETS = ['USDT', 'ETHFI', 'FDUSDT']
+
+
+def spot_holdings(account_info):
+    exclusion1 = EXCLUDED_ASSETS + ['LD' + x for x in EXCLUDED_ASSETS]
+    exclusion2 = ['LD' + x['asset'] for x in account_info['balances']]
     exclusions = exclusion1 + exclusion2
-    SPOT_ASSET += [x['asset'] + "USDT" for x in ACCOUNT_INFO['balances'] if float(x['free']) > 0 and x['asset'] not in exclusions]
-    
-
-
-
-def calculate_asset(sort_by='Current Value'):
-    global LAST_UPDATED, SPOT_ASSET, PRICE_DICT, ACCOUNT_INFO, BALANCE, TOTAL_PROFIT_LOSS
-    LAST_UPDATED = datetime.now()
-
-    prices = client.ticker_price(symbols=SPOT_ASSET)
-    PRICE_DICT = {item['symbol']: float(item['price']) for item in prices}
-
-    asset_data = []
-    for asset in ACCOUNT_INFO['balances']:
-        if float(asset['free']) > 0 :
-            symbol = asset['asset'] + "USDT"
-            try:
-                # Get the current price
-                current_price = PRICE_DICT.get(symbol, 0)
-                
-                if float(asset['free']) * current_price > 1:
-                    # Fetch all trades for the symbol
-                    trades = client.my_trades(symbol)
-                    try:
-                        fdusd_trades = (client.my_trades(symbol.replace('USDT', 'FDUSD')))
-                        trades += fdusd_trades
-                    except:
-                        pass
-
-
-                    # Calculate the total cost and total quantity
-                    total_cost = 0
-                    total_qty = 0
-                    for trade in trades:
-                        if trade['isBuyer']:
-                            total_cost += float(trade['price']) * float(trade['qty'])
-                            total_qty += float(trade['qty'])
-                        else:
-                            total_cost -= float(trade['price']) * float(trade['qty'])
-                            total_qty -= float(trade['qty'])
-                            if total_qty < 0:
-                                total_qty = 0
-                                total_cost = 0
-                    
-                    # Calculate the average cost
-                    avg_price = total_cost / total_qty if total_qty > 0 else 0
-
-                    # Current asset value
-                    asset_value = float(asset['free']) * current_price
-                    
-                    # Calculate the percentage change
-                    pct_change = ((current_price - avg_price) / avg_price) * 100 if avg_price > 0 else 0
-
-
-                    # Calculate the profit or loss
-                    profit_loss = asset_value - total_cost
-                    TOTAL_PROFIT_LOSS += profit_loss
-                    
-                    asset_value = float(asset['free']) * current_price
-                    asset_data.append([asset['asset'], asset['free'], avg_price, total_cost, current_price, asset_value, profit_loss, pct_change])
-            except Exception as e:
-                continue
-
-    # Create a DataFrame and print it
-    df = pd.DataFrame(asset_data, columns=['Asset', 'Free', 'Average Price', 'Total Cost', 'Current Price', 'Current Value', 'Profit/Loss', 'Percentage Change'])
-    df = df.sort_values(sort_by, ascending=False)
-
-    return df
-
-
-def print_df(df):
-    global LAST_UPDATED, USDT_IDR_RATE, TOTAL_ASSET_IN_USDT, TOTAL_PROFIT_LOSS, TOTAL_SPOT_VALUE
-    os.system('clear')
-
-    print(df)
-    print(f"\n\nUpdated at: {LAST_UPDATED}")
-    print(f"USDT/IDR exchange rate: {USDT_IDR_RATE}")
-
-
-    print(f"\n\n=== SPOT ===")
-    print(f"Total Spot in USDT: {TOTAL_SPOT_VALUE}")
-    print(f"Total Spot in IDR: {format_currency(TOTAL_SPOT_VALUE * USDT_IDR_RATE)}")
-    print(f"Total profit/loss in USDT: {TOTAL_PROFIT_LOSS}")
-    print(f"Total profit/loss in IDR: {format_currency(TOTAL_PROFIT_LOSS * USDT_IDR_RATE)}")
-    print("==================================== \n\n")
-
-
-    print(f"Total All Asset in USDT: {TOTAL_ASSET_IN_USDT}")
-    print(f"Total All Asset in IDR: {format_currency(TOTAL_ASSET_IN_USDT * USDT_IDR_RATE)}")
+    return {x['asset']: float(x['free']) for x in account_info['balances'] if float(x['free']) > 0 and x['asset'] not in exclusions}
+
+
+def spot_symbols(holdings):
+    return ['BTCUSDT'] + [asset + "USDT" for asset in holdings]
+
+
+def get_wallets(client=None):
+    return {item['walletName']: float(item['balance']) for item in (client or get_client()).balance()}
+
+
+def get_spot_asset(client=None):
+    return spot_holdings((client or get_client()).account())
+
+
+def calculate_asset(holdings, prices, sync_trades=True):
+    records = []
+    for asset, free in holdings.items():
+        try:
+            # Get the current price
+            current_price = prices.get(asset + "USDT", 0)
+
+            if free * current_price > 1:
+                # Only trades newer than the last synced id are fetched
+                if sync_trades:
+                    with metrics.timer('assets.sync'):
+                        total_cost, total_qty = sync_asset(get_client(), get_trade_store(), asset)
+                else:
+                    total_cost, total_qty = get_trade_store().get_cost_basis(asset)
+                records.append(asset_record(asset, free, current_price, total_cost, total_qty))
+        except Exception as e:
+            # The asset is left out of the table; count it so it doesn't vanish silently
+            metrics.error('assets', e)
+            continue
+    return records
+
+
+def take_snapshot(previous=None, refresh_account=True, include_assets=True, timings=None, client=None):
+    """Build a new PortfolioSnapshot, reusing `previous` account data when not refreshing it.
+
+    `client` reads another account's balances (a bot tenant); trades and
+    cost basis are only synced for the configured account.
+    """
+    timings = timings if timings is not None else {}
+
+    def timed(phase, func, *args, **kwargs):
+        start = time.perf_counter()
+        with metrics.timer(f'snapshot.{phase}'):
+            result = func(*args, **kwargs)
+        timings[phase] = time.perf_counter() - start
+        return result
+
+    if refresh_account or previous is None:
+        holdings = timed('account', get_spot_asset, client) if include_assets else {}
+        wallets = timed('wallets', get_wallets, client)
+    else:
+        holdings, wallets = previous.holdings, previous.wallets
+
+    symbols = spot_symbols(holdings)
+    # Joins the caller's price cycle rather than restarting it, so every price
+    # the cycle needs still comes from one request
+    get_prices().want(["USDTIDRT"] + symbols)
+    prices = timed('prices', get_prices().get_many, ["USDTIDRT"] + symbols)
+
+    records = timed('assets', calculate_asset, holdings, prices, sync_trades=refresh_account) if include_assets else []
+
+    return PortfolioSnapshot(datetime.now(), prices.get("USDTIDRT", 0), prices, wallets, holdings, symbols, records)
+
+
+def get_balance(client=None):
+    snapshot = take_snapshot(include_assets=False, client=client)
+    return snapshot.total_asset_in_usdt, snapshot.usdt_idr_rate
+
+
+def format_report(snapshot, sort_by='Current Value'):
+    rate = snapshot.usdt_idr_rate
+    lines = snapshot.to_frame(sort_by).to_string().splitlines()
+    lines += [
+        "",
+        "",
+        f"Updated at: {snapshot.updated_at}",
+        f"USDT/IDR exchange rate: {rate}",
+        "",
+        "",
+        "=== SPOT ===",
+        f"Total Spot in USDT: {snapshot.total_spot_value}",
+        f"Total Spot in IDR: {format_currency(snapshot.total_spot_value * rate)}",
+        f"Total profit/loss in USDT: {snapshot.total_profit_loss}",
+        f"Total profit/loss in IDR: {format_currency(snapshot.total_profit_loss * rate)}",
+        "==================================== ",
+        "",
+        "",
+        f"Total All Asset in USDT: {snapshot.total_asset_in_usdt}",
+        f"Total All Asset in IDR: {format_currency(snapshot.total_asset_in_usdt * rate)}",
+    ]
+
+    stats = scheduler.stats()
+    lines += ["", f"Requests: {stats['calls']} calls, {stats['throttled']} throttled, {stats['retried']} retried, {stats['failed']} failed, weight left {stats['tokens']}"]
+    return lines
+
+
+def watch(sort_by, loops, interval, account_interval, print_output=True):
+    """Prices every `interval` seconds, account info and trades every `account_interval`."""
+    renderer = DiffRenderer()
+    timings = {}
+    snapshot = None
+    account_refreshed_at = None
+
+    loop_count = 0
+    while loops == -1 or loop_count < loops:
+        started = time.monotonic()
+        refresh_account = account_refreshed_at is None or started - account_refreshed_at >= account_interval
+        if refresh_account:
+            account_refreshed_at = started
+
+        # Each pass is one price cycle
+        get_prices().start_cycle(["USDTIDRT"] + list(snapshot.spot_symbols if snapshot else []))
+        snapshot = take_snapshot(snapshot, refresh_account=refresh_account, timings=timings)
+        if print_output:
+            phases = ' '.join(f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in timings.items())
+            renderer.draw(format_report(snapshot, sort_by) + ["", f"[{datetime.now():%H:%M:%S}] {phases}"])
+        loop_count += 1
+        time.sleep(interval)
 
 def main(print_output=True):
     parser = argparse.ArgumentParser()
     parser.add_argument('--sortby', default='Current Value')
     parser.add_argument('--loops', type=int, default=1)
     parser.add_argument('--interval', type=int, default=1)
+    parser.add_argument('--account-interval', type=int, default=60)
     args = parser.parse_args()
 
-    sort_by = args.sortby
-    loops = args.loops
-    interval = args.interval
-
-    loop_count = 0
-    while loops == -1 or loop_count < loops:
-        get_balance()
-        get_spot_asset()
-        df = calculate_asset(sort_by=sort_by)
-        if print_output:
-            print_df(df)
-        loop_count += 1
-        time.sleep(interval)
+    setup_pandas()
+    watch(args.sortby, args.loops, args.interval, args.account_interval, print_output)
 
 if __name__ == "__main__":
-    # python3 binance-script.py --sortby="Percentage Change" --loops=5 --interval=5
+    # python3 binance-script.py --sortby="Percentage Change" --loops=5 --interval=5 --account-interval=60
     main()
\ No newline at end of file
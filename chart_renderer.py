@@ -0,0 +1,126 @@
+import asyncio
+import io
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from metrics import metrics
+
+
+MAX_POINTS = 1000
+CACHE_SIZE = 32
+
+# matplotlib is CPU bound and not thread safe, so charts render in worker processes
+executor = ProcessPoolExecutor(max_workers=2)
+
+
+def millions(x, pos):
+    'The two args are the value and tick position'
+    return '%1.1fM' % (x * 1e-6)
+
+
+def downsample(df, max_points=MAX_POINTS):
+    # Average into equal time buckets so a long history plots at most ~max_points rows
+    if len(df) <= max_points:
+        return df
+    bucket = (df.index[-1] - df.index[0]) / max_points
+    return df.resample(bucket).mean().dropna(how='all')
+
+
+def render_chart(df):
+    """Render the 3-panel portfolio chart into PNG bytes."""
+    from matplotlib.figure import Figure
+    from matplotlib.ticker import FuncFormatter
+
+    formatter = FuncFormatter(millions)
+
+    # Create a figure and a set of subplots
+    fig = Figure(figsize=(10, 10))
+    axs = fig.subplots(3, 1)
+
+    # Plot the BTC price data on the first subplot
+    axs[0].plot(df.index, df['BTC_Price'], color='g', label='BTC Price')
+    axs[0].set_ylabel('BTC Price')
+    axs[0].set_title('BTC Price and Total BTC Over Time')
+    axs[0].legend(loc='upper left')
+
+    # Create a second y-axis for the first subplot that shares the same x-axis
+    ax4 = axs[0].twinx()
+
+    # Plot the Total BTC data on the second y-axis of the first subplot
+    ax4.plot(df.index, df['Total_BTC'], color='b', label='Total BTC')
+    ax4.set_ylabel('Total BTC')
+    ax4.legend(loc='upper right')
+
+    # Plot the Binance USDT data on the second subplot
+    axs[1].plot(df.index, df['Binance_USDT'], color='r', label='Binance USDT')
+    axs[1].set_ylabel('Binance USDT')
+    axs[1].set_title('Binance and Gate io USDT Value Over Time')
+    axs[1].legend(loc='upper left')
+
+
+    # Create a second y-axis for the second subplot that shares the same x-axis
+    ax2 = axs[1].twinx()
+
+
+    # Plot the Gate io USDT data on the second y-axis of the second subplot
+    ax2.plot(df.index, df['Gate_USDT'], color='b', label='Gate USDT')
+    ax2.set_ylabel('Gate USDT')
+    ax2.legend(loc='upper right')
+
+    # Plot the USDT data on the second subplot
+    axs[2].plot(df.index, df['Total_USDT'], color='r', label='USDT')
+    axs[2].set_ylabel('Value in USDT')
+    axs[2].set_title('USDT and IDR Value Over Time')
+    axs[2].legend(loc='upper left')
+
+    # Create a second y-axis for the second subplot that shares the same x-axis
+    ax3 = axs[2].twinx()
+
+    # Plot the IDR data on the second y-axis of the second subplot
+    ax3.plot(df.index, df['Total_IDR'], color='b', label='IDR')
+    ax3.set_ylabel('Value in IDR')
+    ax3.legend(loc='upper right')
+
+    # Apply the formatter to the y-axis of the second plot
+    ax3.yaxis.set_major_formatter(formatter)
+
+    # Adjust the layout
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+class ChartCache:
+    """Rendered PNGs keyed by (start, end, latest data timestamp).
+
+    A new history row changes the key, so stale charts are never served;
+    identical requests in flight share one render.
+    """
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.charts = OrderedDict()
+        self._inflight = {}
+
+    async def _render(self, key, load):
+        try:
+            df = downsample(await load())
+            loop = asyncio.get_running_loop()
+            with metrics.timer('chart.render'):
+                png = await loop.run_in_executor(executor, render_chart, df)
+            self.charts[key] = png
+            if len(self.charts) > self.size:
+                self.charts.popitem(last=False)
+            return png
+        finally:
+            self._inflight.pop(key, None)
+
+    async def get(self, key, load):
+        if key in self.charts:
+            self.charts.move_to_end(key)
+            return self.charts[key]
+        if key not in self._inflight:
+            self._inflight[key] = asyncio.ensure_future(self._render(key, load))
+        return await asyncio.shield(self._inflight[key])
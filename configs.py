@@ -6,13 +6,62 @@ load_dotenv()
 # Binance
 BINANCE_API_KEY = os.getenv("BINANCE_API_KEY")
 BINANCE_SECRET = os.getenv("BINANCE_SECRET")
+# Point at another API host, e.g. the fake exchange used by bench_load.py
+BINANCE_BASE_URL = os.getenv("BINANCE_BASE_URL")
 
 # Gate
 GATE_API_KEY = os.getenv("GATE_API_KEY")
 GATE_SECRET = os.getenv("GATE_SECRET")
+GATE_HOST = os.getenv("GATE_HOST")
+# How far back the first Gate.io trade sync reaches; later syncs resume from a cursor
+GATE_HISTORY_DAYS = int(os.getenv("GATE_HISTORY_DAYS", 365))
 
 # Wallet
 WALLET_ADDRESS = os.getenv("WALLET_ADDRESS")
+# Addresses, chains and tokens to scan; see wallet_script.load_wallets
+WALLETS_FILE = os.getenv("WALLETS_FILE", "wallets.json")
 
 # Telegram
-TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
\ No newline at end of file
+TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+
+# Cache
+SNAPSHOT_TTL = int(os.getenv("SNAPSHOT_TTL", 60))
+
+# Alerts
+# Active alerts one chat may hold; admins aren't limited
+ALERTS_PER_CHAT = int(os.getenv("ALERTS_PER_CHAT", 100))
+
+# Price stream
+PRICE_STREAM = os.getenv("PRICE_STREAM", "0") == "1"
+# Another combined-stream endpoint, e.g. the replay server in fake_stream.py
+PRICE_STREAM_URL = os.getenv("PRICE_STREAM_URL")
+
+# Connectors
+CONNECTOR_TIMEOUT = int(os.getenv("CONNECTOR_TIMEOUT", 10))
+
+# HTTP
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 10))
+
+# Metrics
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+# Cycles slower than this many seconds dump sampled stacks to profiles/; 0 disables
+PROFILE_SLOW_SECONDS = float(os.getenv("PROFILE_SLOW_SECONDS", 0))
+# Comma-separated usernames or ids given the admin role on top of whitelist.txt
+ADMIN_USERS = [user.strip() for user in os.getenv("ADMIN_USERS", "").split(",") if user.strip()]
+
+# Tenants
+# Tenants refreshed at once per process; the Binance weight budget is still shared
+TENANT_CONCURRENCY = int(os.getenv("TENANT_CONCURRENCY", 8))
+# Keep-alive connections per tenant client, kept small since there can be hundreds
+TENANT_POOL_SIZE = int(os.getenv("TENANT_POOL_SIZE", 2))
+# "<index>/<count>": this process refreshes tenants whose chat id % count == index
+TENANT_SHARD = os.getenv("TENANT_SHARD", "0/1")
+
+# Notifications
+# Telegram allows about 30 messages per second overall and one per second per chat
+NOTIFY_RATE = float(os.getenv("NOTIFY_RATE", 30))
+NOTIFY_CHAT_INTERVAL = float(os.getenv("NOTIFY_CHAT_INTERVAL", 1))
+NOTIFY_WORKERS = int(os.getenv("NOTIFY_WORKERS", 16))
+# Notifications waiting to be sent; more are dropped and fire again on a later check
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", 10000))
@@ -0,0 +1,112 @@
+import asyncio
+
+from configs import CONNECTOR_TIMEOUT, TENANT_POOL_SIZE
+from fetcher import run_with_timeout
+from metrics import metrics
+
+
+class Connector:
+    """A venue holding part of the portfolio.
+
+    Subclasses implement get_balance(), a blocking call that the aggregator
+    runs on the fetcher pool, bounded by the connector's own timeout.
+    Prices and trades are not per-venue calls here: they go through
+    PriceService and the trade stores.
+    """
+
+    name = None
+
+    def __init__(self, timeout=CONNECTOR_TIMEOUT):
+        self.timeout = timeout
+        self.last_balance = None
+
+    def get_balance(self):
+        """Total value held on the venue, in USDT."""
+        raise NotImplementedError
+
+
+class BinanceConnector(Connector):
+    """The configured account, or another one when `api_key`/`secret` are given."""
+
+    name = 'binance'
+
+    def __init__(self, api_key=None, secret=None, timeout=CONNECTOR_TIMEOUT):
+        super().__init__(timeout)
+        self.api_key = api_key
+        self.secret = secret
+
+    def client(self):
+        from binance_script import get_client
+        if self.api_key:
+            return get_client(self.api_key, self.secret, TENANT_POOL_SIZE)
+        return get_client()
+
+    def get_balance(self):
+        from binance_script import get_balance
+        total_usdt, _ = get_balance(self.client())
+        return total_usdt
+
+
+class GateConnector(Connector):
+    name = 'gate'
+
+    def __init__(self, api_key=None, secret=None, timeout=CONNECTOR_TIMEOUT):
+        super().__init__(timeout)
+        self.api_key = api_key
+        self.secret = secret
+
+    def get_balance(self):
+        from gate_script import get_api_client, get_balance
+        if self.api_key:
+            return get_balance(get_api_client(self.api_key, self.secret, TENANT_POOL_SIZE))
+        return get_balance()
+
+
+class BitgetConnector(Connector):
+    """No API access yet: fixed holdings valued at Binance prices."""
+
+    name = 'bitget'
+
+    def __init__(self, holdings=None, timeout=CONNECTOR_TIMEOUT):
+        super().__init__(timeout)
+        self.holdings = holdings if holdings is not None else {'MANTA': 0}
+
+    def get_balance(self):
+        from binance_script import get_prices
+        prices = get_prices().get_many([f"{asset}USDT" for asset in self.holdings])
+        return sum(qty * prices.get(f"{asset}USDT", 0) for asset, qty in self.holdings.items())
+
+
+class WalletConnector(Connector):
+    """On-chain wallets scanned by wallet_script, or a fixed USDT value when `fixed_balance` is given."""
+
+    name = 'wallet'
+
+    def __init__(self, fixed_balance=None, timeout=CONNECTOR_TIMEOUT):
+        super().__init__(timeout)
+        self.fixed_balance = fixed_balance
+
+    def get_balance(self):
+        if self.fixed_balance is not None:
+            return self.fixed_balance
+        from wallet_script import get_balance
+        _, balance_usdt = get_balance()
+        return balance_usdt
+
+
+async def fetch_balance(connector):
+    try:
+        with metrics.timer(f'balance.{connector.name}'):
+            balance = await run_with_timeout(connector.get_balance, connector.timeout)
+    except Exception as e:
+        # Slow or failing venue: report the last known value, marked stale
+        metrics.inc('stale_total', venue=connector.name)
+        return {'usdt': connector.last_balance or 0, 'stale': True, 'error': repr(e)}
+    connector.last_balance = balance
+    return {'usdt': balance, 'stale': False, 'error': None}
+
+
+async def aggregate(connectors):
+    """Query every connector in parallel; returns name -> {'usdt', 'stale', 'error'}."""
+    results = await asyncio.gather(*[fetch_balance(connector) for connector in connectors])
+    return {connector.name: result for connector, result in zip(connectors, results)}
@@ -0,0 +1,186 @@
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+QUOTES = ['USDT', 'FDUSD']
+COLUMNS = ['asset', 'time', 'id', 'price', 'qty', 'is_buyer']
+RESULT_COLUMNS = ['total_cost', 'total_qty', 'avg_price']
+# Quantities are compared in integer units of Binance's finest step (1e-8), so
+# "sold everything" is exactly zero in every path instead of +-1e-17 depending
+# on summation order; int64 keeps that exact for net positions up to ~9e10
+QTY_SCALE = 10**8
+
+
+def split_symbol(symbol):
+    # BTCUSDT and BTCFDUSD both count towards BTC
+    for quote in QUOTES:
+        if symbol.endswith(quote):
+            return symbol[:-len(quote)]
+    return symbol
+
+
+def trades_to_frame(trades):
+    """Parse raw Binance trades (any mix of symbols) into one typed frame."""
+    if not trades:
+        return pd.DataFrame(columns=COLUMNS)
+
+    # Symbols repeat a lot, so split them once per distinct symbol
+    symbol_codes, symbols = pd.factorize(pd.Series([t['symbol'] for t in trades]))
+    assets = np.array([split_symbol(s) for s in symbols], dtype=object)[symbol_codes]
+
+    frame = pd.DataFrame({
+        'asset': assets,
+        'time': np.fromiter((t['time'] for t in trades), np.int64, len(trades)),
+        'id': np.fromiter((t['id'] for t in trades), np.int64, len(trades)),
+        'price': np.fromiter((float(t['price']) for t in trades), np.float64, len(trades)),
+        'qty': np.fromiter((float(t['qty']) for t in trades), np.float64, len(trades)),
+        'is_buyer': np.fromiter((t['isBuyer'] for t in trades), bool, len(trades)),
+    })
+    return frame.sort_values(['asset', 'time', 'id'], kind='stable', ignore_index=True)
+
+
+def _running_state(dq, dc, sells):
+    # Running qty with "reset to zero when a sell closes or oversells the
+    # position" is a cumulative sum reflected at zero: qty = S - F with
+    # F = min(0, cummin(S)). A reset happens exactly where a sell brings S
+    # down to the floor or below, and the cost restarts from there.
+    qty_sum = np.cumsum(dq)
+    cost_sum = np.cumsum(dc)
+
+    floor = np.minimum.accumulate(np.minimum(qty_sum, 0))
+    prior_floor = np.concatenate([[0], floor[:-1]])
+    reset = sells & (qty_sum <= prior_floor)
+
+    last_reset = np.maximum.accumulate(np.where(reset, np.arange(len(dq)), -1))
+    cost_base = np.where(last_reset >= 0, cost_sum[last_reset], 0)
+    return cost_sum - cost_base, (qty_sum - floor) / QTY_SCALE
+
+
+def _summarize(assets, total_cost, total_qty):
+    total_cost = np.asarray(total_cost, dtype=np.float64)
+    total_qty = np.asarray(total_qty, dtype=np.float64)
+    avg_price = np.divide(total_cost, total_qty, out=np.zeros_like(total_cost), where=total_qty > 0)
+    result = pd.DataFrame({'total_cost': total_cost, 'total_qty': total_qty, 'avg_price': avg_price},
+                          index=pd.Index(assets, name='asset'))
+    return result[RESULT_COLUMNS]
+
+
+def to_units(qty):
+    return np.rint(np.asarray(qty, dtype=np.float64) * QTY_SCALE).astype(np.int64)
+
+
+def _signed(frame):
+    # (signed qty in units, signed cost, sell mask)
+    sells = ~frame['is_buyer'].to_numpy(dtype=bool)
+    qty = frame['qty'].to_numpy(dtype=np.float64)
+    units = to_units(qty)
+    dc = np.where(sells, -1.0, 1.0) * qty * frame['price'].to_numpy(dtype=np.float64)
+    return np.where(sells, -units, units), dc, sells
+
+
+def _asset_slices(frame):
+    # trades_to_frame keeps each asset contiguous; anything else is sorted here
+    if not frame['asset'].is_monotonic_increasing:
+        frame = frame.sort_values('asset', kind='stable', ignore_index=True)
+    assets = frame['asset'].to_numpy()
+    starts = np.flatnonzero(np.concatenate([[True], assets[1:] != assets[:-1]]))
+    ends = np.append(starts[1:], len(assets))
+    return frame, assets[starts], list(zip(starts, ends))
+
+
+def average_cost(frame):
+    """Average-cost basis for every asset in `frame`, vectorized per asset."""
+    if frame.empty:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    frame, assets, slices = _asset_slices(frame)
+    dq, dc, sells = _signed(frame)
+    totals = [_running_state(dq[a:b], dc[a:b], sells[a:b]) for a, b in slices]
+    return _summarize(assets, [c[-1] for c, _ in totals], [q[-1] for _, q in totals])
+
+
+def holdings_over_time(frame):
+    """Per asset, the trade times and the running quantity held after each trade."""
+    if frame.empty:
+        return {}
+
+    frame, assets, slices = _asset_slices(frame)
+    dq, dc, sells = _signed(frame)
+    times = frame['time'].to_numpy(dtype=np.int64)
+    return {asset: (times[a:b], _running_state(dq[a:b], dc[a:b], sells[a:b])[1]) for asset, (a, b) in zip(assets, slices)}
+
+
+def fifo_cost(frame):
+    """FIFO basis: sells consume the oldest open lots, oversells just empty the queue."""
+    if frame.empty:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    frame, assets, slices = _asset_slices(frame)
+    prices = frame['price'].to_numpy(dtype=np.float64)
+    qtys = frame['qty'].to_numpy(dtype=np.float64)
+    buys = frame['is_buyer'].to_numpy()
+
+    costs, totals = [], []
+    for a, b in slices:
+        lots = deque()
+        for price, qty, is_buyer in zip(prices[a:b], qtys[a:b], buys[a:b]):
+            if is_buyer:
+                lots.append([qty, price])
+                continue
+            while qty > 0 and lots:
+                take = min(lots[0][0], qty)
+                lots[0][0] -= take
+                qty -= take
+                if lots[0][0] <= 0:
+                    lots.popleft()
+        costs.append(sum(q * p for q, p in lots))
+        totals.append(sum(q for q, _ in lots))
+
+    return _summarize(assets, costs, totals)
+
+
+METHODS = {
+    'average': average_cost,
+    'fifo': fifo_cost,
+}
+
+
+def cost_basis(trades, method='average'):
+    frame = trades if isinstance(trades, pd.DataFrame) else trades_to_frame(trades)
+    return METHODS[method](frame)
+
+
+def apply_trades(total_cost, total_qty, trades):
+    """Fold new trades for one asset into a persisted (total_cost, total_qty)."""
+    frame = trades_to_frame(trades)
+    if frame.empty:
+        return total_cost, total_qty
+
+    # The carried-over state enters as a leading buy so the same reset rule applies
+    dq, dc, sells = _signed(frame.sort_values(['time', 'id'], kind='stable'))
+    cost, qty = _running_state(np.concatenate([to_units([total_qty]), dq]), np.concatenate([[total_cost], dc]),
+                               np.concatenate([[False], sells]))
+    return float(cost[-1]), float(qty[-1])
+
+
+def average_cost_loop(trades):
+    # The original per-trade loop from calculate_asset, kept as the reference
+    # implementation for the benchmark; quantities in QTY_SCALE units like the
+    # vectorized path, and a sell that empties the position resets it
+    total_cost = 0
+    total_units = 0
+    for trade in trades:
+        qty = float(trade['qty'])
+        # round() and np.rint both round half to even
+        units = round(qty * QTY_SCALE)
+        if trade['isBuyer']:
+            total_cost += float(trade['price']) * qty
+            total_units += units
+        else:
+            total_cost -= float(trade['price']) * qty
+            total_units -= units
+            if total_units <= 0:
+                total_units = 0
+                total_cost = 0
+    return total_cost, total_units / QTY_SCALE
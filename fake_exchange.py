@@ -0,0 +1,187 @@
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeExchange:
+    """In-memory Binance + Gate.io + JSON-RPC node stand-in with configurable size, latency and errors.
+
+    Serves only the endpoints this project calls. Prices, holdings and
+    trades are generated from `seed`, so repeated runs see the same data.
+    POSTs to /rpc/<chain> answer JSON-RPC batches; every address holds
+    1.5 native coins and 1000e6 raw units of every token.
+    """
+
+    def __init__(self, assets=20, trades_per_symbol=500, latency_ms=0, error_rate=0.0, seed=0):
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = Counter()
+        self.lock = threading.Lock()
+
+        self.assets = [f"COIN{i}" for i in range(assets)]
+        self.prices = {'BTCUSDT': 60000.0, 'USDTIDRT': 16000.0, 'MANTAUSDT': 2.0, 'ETHUSDT': 3000.0}
+        self.prices.update({f"{asset}USDT": round(self.random.uniform(0.1, 100), 4) for asset in self.assets})
+        self.holdings = {asset: round(self.random.uniform(1, 100), 4) for asset in self.assets}
+        self.trades = {f"{asset}USDT": self._make_trades(f"{asset}USDT", trades_per_symbol) for asset in self.assets}
+
+    def _make_trades(self, symbol, count):
+        price = self.prices[symbol]
+        return [{
+            'symbol': symbol, 'id': i, 'orderId': i, 'price': f"{price * self.random.uniform(0.5, 1.5):.8f}",
+            'qty': f"{self.random.uniform(0.1, 5):.8f}", 'quoteQty': '0', 'commission': '0', 'commissionAsset': 'BNB',
+            'time': 1_700_000_000_000 + i * 60_000, 'isBuyer': self.random.random() < 0.6, 'isMaker': False, 'isBestMatch': True,
+        } for i in range(count)]
+
+    def count(self, path):
+        with self.lock:
+            self.requests[path] += 1
+
+    def reset_counts(self):
+        with self.lock:
+            self.requests.clear()
+
+    def rpc(self, request):
+        method, params = request['method'], request.get('params', [])
+        if method == 'eth_blockNumber':
+            # A new block every two seconds
+            result = hex(int(time.time() // 2))
+        elif method == 'eth_getBalance':
+            result = hex(15 * 10**17)
+        elif method == 'eth_call' and params[0]['data'].startswith('0x70a08231'):
+            result = '0x' + hex(1000 * 10**6)[2:].rjust(64, '0')
+        else:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': -32601, 'message': 'Method not found'}}
+        return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': result}
+
+    def handle(self, path, query, body=None):
+        if path.startswith('/rpc'):
+            if isinstance(body, list):
+                return 200, [self.rpc(request) for request in body]
+            return 200, self.rpc(body)
+        if path == '/api/v3/ticker/price':
+            if 'symbol' in query:
+                return self._ticker(query['symbol'])
+            symbols = json.loads(query['symbols']) if 'symbols' in query else list(self.prices)
+            unknown = [s for s in symbols if s not in self.prices]
+            if unknown:
+                return 400, {'code': -1121, 'msg': 'Invalid symbol.'}
+            return 200, [{'symbol': s, 'price': str(self.prices[s])} for s in symbols]
+        if path == '/sapi/v1/asset/wallet/balance':
+            return 200, [{'activate': True, 'balance': '0.5', 'walletName': 'Spot'},
+                         {'activate': True, 'balance': '0.1', 'walletName': 'Funding'}]
+        if path == '/api/v3/account':
+            balances = [{'asset': a, 'free': str(q), 'locked': '0'} for a, q in self.holdings.items()]
+            return 200, {'balances': balances + [{'asset': 'USDT', 'free': '100', 'locked': '0'}]}
+        if path == '/api/v3/myTrades':
+            trades = self.trades.get(query.get('symbol'))
+            if trades is None:
+                return 400, {'code': -1121, 'msg': 'Invalid symbol.'}
+            from_id = int(query.get('fromId', 0))
+            limit = int(query.get('limit', 500))
+            return 200, trades[from_id:from_id + limit]
+        if path == '/api/v3/klines':
+            return self._klines(query)
+        if path.endswith('/wallet/total_balance'):
+            return 200, {'total': {'amount': '2000.5', 'currency': 'USDT'}, 'details': {}}
+        if path.endswith('/spot/accounts'):
+            return 200, [{'currency': a, 'available': str(q), 'locked': '0'} for a, q in self.holdings.items()]
+        if path.endswith('/spot/tickers'):
+            return 200, [{'currency_pair': s[:-4] + '_USDT', 'last': str(p)} for s, p in self.prices.items() if s.endswith('USDT')]
+        if path.endswith('/spot/my_trades'):
+            return 200, self._gate_trades(query)
+        return 404, {'code': -1, 'msg': f'Unknown path {path}'}
+
+    def _gate_trades(self, query):
+        # The Binance trades in Gate's shape, newest first like the real endpoint
+        start = int(query.get('from', 0)) * 1000
+        end = int(query.get('to', time.time())) * 1000
+        page, limit = int(query.get('page', 1)), int(query.get('limit', 100))
+        trades = sorted((t for trades in self.trades.values() for t in trades if start <= t['time'] <= end),
+                        key=lambda t: t['time'], reverse=True)
+        return [{
+            'id': str(t['id'] * 10_000 + self.assets.index(t['symbol'][:-4])), 'currency_pair': t['symbol'][:-4] + '_USDT',
+            'create_time': str(t['time'] // 1000), 'create_time_ms': f"{t['time']}.000", 'side': 'buy' if t['isBuyer'] else 'sell',
+            'role': 'taker', 'amount': t['qty'], 'price': t['price'], 'fee': '0', 'fee_currency': 'USDT',
+        } for t in trades[(page - 1) * limit:page * limit]]
+
+    def _ticker(self, symbol):
+        if symbol not in self.prices:
+            return 400, {'code': -1121, 'msg': 'Invalid symbol.'}
+        return 200, {'symbol': symbol, 'price': str(self.prices[symbol])}
+
+    def _klines(self, query):
+        symbol = query['symbol']
+        if symbol not in self.prices:
+            return 400, {'code': -1121, 'msg': 'Invalid symbol.'}
+        step = 3_600_000
+        start = int(query.get('startTime', 0))
+        end = int(query.get('endTime', start + step * 1000))
+        limit = int(query.get('limit', 500))
+        times = range(start - start % step, end + 1, step)
+        price = self.prices[symbol]
+        return 200, [[t, '0', '0', '0', str(price), '0', t + step - 1] for t in list(times)[:limit]]
+
+
+def make_handler(exchange):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def _respond(self):
+            url = urlparse(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length)) if length and url.path.startswith('/rpc') else None
+            exchange.count(url.path)
+            if exchange.latency:
+                time.sleep(exchange.latency)
+
+            if exchange.error_rate and exchange.random.random() < exchange.error_rate:
+                status, payload = 429, {'code': -1003, 'msg': 'Too many requests.'}
+            else:
+                status, payload = exchange.handle(url.path, query, body)
+
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            if status == 429:
+                self.send_header('Retry-After', '0')
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = _respond
+        do_POST = _respond
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(exchange, host='127.0.0.1', port=0):
+    """Start the fake exchange in a daemon thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), make_handler(exchange))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+if __name__ == '__main__':
+    # python3 fake_exchange.py --port 8900 --assets 50 --latency-ms 80
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--assets', type=int, default=20)
+    parser.add_argument('--trades', type=int, default=500)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    args = parser.parse_args()
+
+    server, base_url = serve(FakeExchange(args.assets, args.trades, args.latency_ms, args.error_rate), port=args.port)
+    print(f"Fake exchange on {base_url}")
+    server.serve_forever()
@@ -0,0 +1,151 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+
+
+def read_ticks(path):
+    """Recorded ticks as (seconds since the first one, combined-stream message) pairs."""
+    ticks = []
+    with open(path) as file:
+        for line in file:
+            entry = json.loads(line)
+            ticks.append((entry['time'], entry['message']))
+    start = ticks[0][0] if ticks else 0
+    return [(at - start, message) for at, message in ticks]
+
+
+def synthetic_ticks(prices, count, rate=1000, seed=0):
+    """`count` miniTicker messages at `rate` per second, a random walk from `prices` (symbol -> price)."""
+    rng = random.Random(seed)
+    prices = dict(prices)
+    symbols = sorted(prices)
+    ticks = []
+    for i in range(count):
+        symbol = rng.choice(symbols)
+        prices[symbol] *= rng.gauss(1, 0.002)
+        data = {'e': '24hrMiniTicker', 'E': int(i * 1000 / rate), 's': symbol, 'c': f"{prices[symbol]:.8f}"}
+        ticks.append((i / rate, {'stream': f"{symbol.lower()}@miniTicker", 'data': data}))
+    return ticks
+
+
+async def record(path, symbols, seconds, url='wss://stream.binance.com:9443/stream', streams=('miniTicker',)):
+    """Save `seconds` of live combined-stream messages for `symbols` in the format read_ticks() replays."""
+    import websockets
+
+    names = sorted(f"{symbol.lower()}@{stream}" for symbol in symbols for stream in streams)
+    deadline = time.monotonic() + seconds
+    async with websockets.connect(url) as ws:
+        await ws.send(json.dumps({'method': 'SUBSCRIBE', 'params': names, 'id': 1}))
+        with open(path, 'w') as file:
+            while time.monotonic() < deadline:
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=deadline - time.monotonic())
+                except asyncio.TimeoutError:
+                    break
+                message = json.loads(raw)
+                if 'stream' in message:
+                    file.write(json.dumps({'time': time.time(), 'message': message}) + '\n')
+
+
+class ReplayStream:
+    """Binance combined-stream stand-in that replays recorded ticks over a local websocket.
+
+    Answers SUBSCRIBE/UNSUBSCRIBE like the real endpoint and sends each
+    connection only the messages of the streams it subscribed to. The
+    replay starts on a connection's first subscription and keeps the
+    recorded spacing divided by `speed`; speed 0 sends as fast as the
+    client reads. `finished` is set once a connection has had every tick.
+    """
+
+    def __init__(self, ticks, speed=1.0):
+        self.ticks = ticks
+        self.speed = speed
+        self.requests = Counter()
+        self.connections = 0
+        self.sent = 0
+        self.finished = asyncio.Event()
+
+    async def _handler(self, ws):
+        from websockets.exceptions import ConnectionClosed
+
+        self.connections += 1
+        subscribed = set()
+        started = asyncio.Event()
+
+        async def read():
+            async for raw in ws:
+                request = json.loads(raw)
+                params = set(request.get('params', []))
+                self.requests[request['method']] += 1
+                if request['method'] == 'SUBSCRIBE':
+                    subscribed.update(params)
+                    started.set()
+                elif request['method'] == 'UNSUBSCRIBE':
+                    subscribed.difference_update(params)
+                await ws.send(json.dumps({'result': None, 'id': request.get('id')}))
+
+        reader = asyncio.ensure_future(read())
+        try:
+            # Until the first subscription, or the client leaving without one
+            waiter = asyncio.ensure_future(started.wait())
+            await asyncio.wait([reader, waiter], return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            if not started.is_set():
+                return
+            begin = time.monotonic()
+            for at, message in self.ticks:
+                if self.speed:
+                    delay = begin + at / self.speed - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                if message['stream'] in subscribed:
+                    await ws.send(json.dumps(message))
+                    self.sent += 1
+            self.finished.set()
+            await reader
+        except ConnectionClosed:
+            # The client went away; a reconnect starts a new replay
+            pass
+        finally:
+            reader.cancel()
+
+    async def serve(self, host='127.0.0.1', port=0):
+        """Start listening; returns (server, url) with the url PriceStream connects to."""
+        from websockets.asyncio.server import serve
+
+        server = await serve(self._handler, host, port)
+        port = server.sockets[0].getsockname()[1]
+        return server, f"ws://{host}:{port}/stream"
+
+
+async def main(args):
+    if args.record:
+        await record(args.record, args.symbols.split(','), args.seconds)
+        return
+    if args.ticks_file:
+        ticks = read_ticks(args.ticks_file)
+    else:
+        from fake_exchange import FakeExchange
+        ticks = synthetic_ticks(FakeExchange(args.assets).prices, args.count)
+    stream = ReplayStream(ticks, args.speed)
+    server, url = await stream.serve(port=args.port)
+    print(f"Replaying {len(ticks)} ticks on {url}")
+    await server.serve_forever()
+
+
+if __name__ == '__main__':
+    # python3 fake_stream.py --record ticks.jsonl --symbols BTCUSDT,ETHUSDT --seconds 600
+    # python3 fake_stream.py --ticks-file ticks.jsonl --port 8901, then PRICE_STREAM_URL=ws://127.0.0.1:8901/stream
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8901)
+    parser.add_argument('--ticks-file')
+    parser.add_argument('--assets', type=int, default=20)
+    parser.add_argument('--count', type=int, default=100_000)
+    parser.add_argument('--speed', type=float, default=1.0)
+    parser.add_argument('--record')
+    parser.add_argument('--symbols', default='BTCUSDT,ETHUSDT')
+    parser.add_argument('--seconds', type=float, default=600)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,55 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+# The exchange SDKs are synchronous, so every call is pushed onto a small
+# bounded pool instead of running on the telegram event loop.
+MAX_WORKERS = 8
+
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='fetcher')
+
+current_executor = contextvars.ContextVar('current_executor', default=None)
+
+
+@contextmanager
+def using_executor(pool):
+    """Run the enclosed run_blocking calls (tasks started inside included) on `pool`."""
+    token = current_executor.set(pool)
+    try:
+        yield
+    finally:
+        current_executor.reset(token)
+
+
+async def run_blocking(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Carry context variables (e.g. request priority) into the worker thread
+    context = contextvars.copy_context()
+    pool = current_executor.get() or executor
+    return await loop.run_in_executor(pool, partial(context.run, func, *args, **kwargs))
+
+
+async def run_with_timeout(func, timeout, *args):
+    """run_blocking, with `timeout` counted from when the call starts running.
+
+    Time spent waiting for a free worker doesn't eat into the call's budget.
+    That wait is bounded by `timeout` too, so a pool full of hung calls
+    fails fast instead of queueing forever; a call that never started is
+    dropped from the queue.
+    """
+    loop = asyncio.get_running_loop()
+    started = asyncio.Event()
+
+    def call():
+        loop.call_soon_threadsafe(started.set)
+        return func(*args)
+
+    future = asyncio.ensure_future(run_blocking(call))
+    try:
+        await asyncio.wait_for(started.wait(), timeout)
+    except asyncio.TimeoutError:
+        future.cancel()
+        raise
+    return await asyncio.wait_for(future, timeout)
@@ -1,22 +1,84 @@
-import gate_api
-from configs import GATE_API_KEY, GATE_SECRET
+from functools import lru_cache
+from configs import GATE_API_KEY, GATE_SECRET, GATE_HOST, HTTP_POOL_SIZE
+from http_session import tune_urllib3_pool
+from metrics import metrics
+from snapshot import asset_record
 
-# Configure the API host
-configuration = gate_api.Configuration(
-    # host="https://api.gate.io/api/v4",
-    key=GATE_API_KEY,
-    secret=GATE_SECRET,
-)
+EXCLUDED_ASSETS = ['USDT', 'POINT']
 
-# Create an API client
-api_client = gate_api.ApiClient(configuration)
+@lru_cache(maxsize=None)
+def get_api_client(key=GATE_API_KEY, secret=GATE_SECRET, pool_size=HTTP_POOL_SIZE):
+    import gate_api
 
-def get_balance():
-    wallet_api = gate_api.WalletApi(api_client)
+    # Configure the API host
+    configuration = gate_api.Configuration(
+        # host="https://api.gate.io/api/v4",
+        key=key,
+        secret=secret,
+    )
+    if GATE_HOST:
+        configuration.host = GATE_HOST
+    configuration.connection_pool_maxsize = pool_size
+
+    # Create an API client, its urllib3 pool keeps connections alive between refreshes
+    api_client = gate_api.ApiClient(configuration)
+    tune_urllib3_pool(api_client.rest_client.pool_manager)
+    return api_client
+
+@lru_cache(maxsize=None)
+def get_trade_store():
+    from gate_trades import GateTradeStore
+    return GateTradeStore()
+
+def get_balance(api_client=None):
+    import gate_api
+    wallet_api = gate_api.WalletApi(api_client or get_api_client())
     balance = float(wallet_api.get_total_balance().total.amount)
     return balance
 
+def get_spot_asset(api_client=None):
+    import gate_api
+    accounts = gate_api.SpotApi(api_client or get_api_client()).list_spot_accounts()
+    return {x.currency: float(x.available) for x in accounts if float(x.available) > 0 and x.currency not in EXCLUDED_ASSETS}
+
+def get_tickers(api_client=None):
+    # Every pair's last price in one request, keyed like BTC_USDT
+    import gate_api
+    tickers = gate_api.SpotApi(api_client or get_api_client()).list_tickers()
+    return {x.currency_pair: float(x.last) for x in tickers if x.last}
+
+def calculate_asset(holdings, tickers, sync_trades=True):
+    """AssetRecords of the configured Gate.io account, like binance_script.calculate_asset."""
+    import gate_api
+    from gate_trades import sync_trades as sync
+
+    store = get_trade_store()
+    if sync_trades:
+        # One cursor covers every pair, so this is one request on a quiet cycle
+        try:
+            sync(gate_api.SpotApi(get_api_client()), store)
+        except Exception as e:
+            # Cost basis stays at the last successful sync
+            metrics.error('gate.trades', e)
+
+    records = []
+    for asset, free in holdings.items():
+        current_price = tickers.get(asset + "_USDT", 0)
+        if free * current_price > 1:
+            total_cost, total_qty = store.get_cost_basis(asset)
+            records.append(asset_record(asset, free, current_price, total_cost, total_qty))
+    return records
+
+def get_asset_table(sync_trades=True):
+    return calculate_asset(get_spot_asset(), get_tickers(), sync_trades)
+
 
 if __name__ == '__main__':
-    balance = get_balance()
-    print(balance)
\ No newline at end of file
+    # Both venues' spot assets in one table
+    import binance_script
+    from snapshot import cross_venue_frame
+
+    binance_script.setup_pandas()
+    snapshot = binance_script.take_snapshot()
+    print(cross_venue_frame({'binance': snapshot.assets, 'gate': get_asset_table()}).to_string())
+    print(f"Total Asset in USDT: {get_balance()}")
@@ -0,0 +1,117 @@
+import time
+from collections import defaultdict
+
+from configs import GATE_HISTORY_DAYS
+from metrics import metrics
+from trade_store import TradeStore
+
+DB_PATH = 'gate_trades.db'
+PAGE_LIMIT = 1000
+# /spot/my_trades only answers time ranges of up to 30 days
+WINDOW = 30 * 24 * 3600
+# Trades can show up a little after their create_time, so the cursor stays
+# this far behind the last sync and the overlap is deduplicated by id
+CURSOR_LAG = 60
+
+
+class GateTradeStore(TradeStore):
+    """Gate.io trades and cost basis, in the TradeStore schema, plus the sync cursor.
+
+    Trades are stored under Binance-style symbols (BTC_USDT as BTCUSDT), so
+    cost_basis and TradeStore.load_frame work on them unchanged.
+    """
+
+    def __init__(self, path=DB_PATH):
+        super().__init__(path)
+        with self.lock, self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS sync_cursor (name TEXT PRIMARY KEY, time INTEGER NOT NULL)")
+
+    def cursor(self):
+        with self.lock:
+            row = self.conn.execute("SELECT time FROM sync_cursor WHERE name = 'my_trades'").fetchone()
+        return row[0] if row else None
+
+    def ids_since(self, time_ms):
+        with self.lock:
+            return {row[0] for row in self.conn.execute("SELECT id FROM trades WHERE time >= ?", (time_ms,))}
+
+    def save_sync(self, states, cursor):
+        # states: asset -> (new trades, total_cost, total_qty); every asset and
+        # the cursor move together, so a crash replays the whole sync or none of it
+        with self.lock, self.conn:
+            for asset, (trades, total_cost, total_qty) in states.items():
+                rows = [(t['symbol'], t['id'], t['time'], float(t['price']), float(t['qty']), int(t['isBuyer'])) for t in trades]
+                self.conn.executemany("INSERT OR IGNORE INTO trades VALUES (?, ?, ?, ?, ?, ?)", rows)
+                self.conn.execute("INSERT OR REPLACE INTO cost_basis VALUES (?, ?, ?)", (asset, total_cost, total_qty))
+            self.conn.execute("INSERT OR REPLACE INTO sync_cursor VALUES ('my_trades', ?)", (cursor,))
+
+
+def to_binance_trade(trade):
+    # The dict shape cost_basis.apply_trades and TradeStore expect
+    return {
+        'symbol': trade.currency_pair.replace('_', ''),
+        'id': int(trade.id),
+        'time': int(float(trade.create_time_ms)),
+        'price': trade.price,
+        'qty': trade.amount,
+        'isBuyer': trade.side == 'buy',
+    }
+
+
+def fetch_new_trades(spot_api, store, now=None):
+    """Trades of every pair since the stored cursor, as (trades, new cursor).
+
+    The first sync walks back GATE_HISTORY_DAYS; later ones usually cost a
+    single request.
+    """
+    from cost_basis import QUOTES
+
+    now = int(now if now is not None else time.time())
+    since = store.cursor()
+    if since is None:
+        since = now - GATE_HISTORY_DAYS * 24 * 3600
+
+    fetched = {}
+    start = since
+    while True:
+        end = min(start + WINDOW, now)
+        page = 1
+        while True:
+            batch = spot_api.list_my_trades(_from=start, to=end, page=page, limit=PAGE_LIMIT)
+            fetched.update((trade.id, trade) for trade in batch)
+            if len(batch) < PAGE_LIMIT:
+                break
+            page += 1
+        if end >= now:
+            break
+        start = end
+
+    known = store.ids_since(since * 1000)
+    trades = []
+    for trade in fetched.values():
+        # Only pairs quoted like the Binance ones count towards cost basis
+        if trade.currency_pair.rsplit('_', 1)[-1] not in QUOTES:
+            continue
+        trade = to_binance_trade(trade)
+        if trade['id'] not in known:
+            trades.append(trade)
+    return trades, max(now - CURSOR_LAG, since)
+
+
+def sync_trades(spot_api, store):
+    """Fold trades since the last sync into the stored cost basis; returns the number of new trades."""
+    from cost_basis import apply_trades, split_symbol
+
+    with metrics.timer('gate.sync'):
+        trades, cursor = fetch_new_trades(spot_api, store)
+
+        by_asset = defaultdict(list)
+        for trade in trades:
+            by_asset[split_symbol(trade['symbol'])].append(trade)
+
+        states = {}
+        for asset, asset_trades in by_asset.items():
+            total_cost, total_qty = apply_trades(*store.get_cost_basis(asset), asset_trades)
+            states[asset] = (asset_trades, total_cost, total_qty)
+        store.save_sync(states, cursor)
+    return len(trades)
@@ -0,0 +1,126 @@
+import argparse
+import sqlite3
+import threading
+import time
+
+DB_PATH = 'history.db'
+
+BALANCE_VS_BTC = 'balance_vs_btc'
+BALANCE_VS_BTC_COLUMNS = ['BTC_Price', 'Binance_USDT', 'Gate_USDT', 'Other_USDT', 'Total_BTC', 'Total_USDT', 'Total_IDR']
+
+BALANCES = 'balances'
+BALANCES_COLUMNS = ['Binance_USDT', 'Gate_USDT', 'Wallet_USDT', 'Total_USDT', 'Total_IDR', 'Total_with_other_usdt', 'Total_with_other_idr']
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# CSV file -> (table, value columns) for the one-shot migration
+CSV_SOURCES = {
+    'balance_vs_btc.csv': (BALANCE_VS_BTC, BALANCE_VS_BTC_COLUMNS),
+    'balances.csv': (BALANCES, BALANCES_COLUMNS),
+}
+
+
+class HistoryStore:
+    """Time series of portfolio values keyed by Date, stored in SQLite.
+
+    Dates are ISO strings, so the primary key index gives the latest row and
+    date-range scans without reading the whole history.
+    """
+
+    def __init__(self, table=BALANCE_VS_BTC, columns=BALANCE_VS_BTC_COLUMNS, path=DB_PATH):
+        self.table = table
+        self.columns = columns
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            column_defs = ', '.join(f'"{c}" REAL' for c in columns)
+            self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ("Date" TEXT PRIMARY KEY, {column_defs})')
+
+    def _insert(self, rows):
+        names = ', '.join(f'"{c}"' for c in ['Date'] + self.columns)
+        marks = ', '.join('?' for _ in range(len(self.columns) + 1))
+        with self.lock, self.conn:
+            self.conn.executemany(f'INSERT OR IGNORE INTO "{self.table}" ({names}) VALUES ({marks})', rows)
+
+    def append(self, df):
+        """Append the rows of a DataFrame with a Date column and the value columns."""
+        import pandas as pd
+        dates = pd.to_datetime(df['Date'], format='mixed').dt.strftime(DATE_FORMAT)
+        values = df[self.columns].astype(float).to_numpy().tolist()
+        self._insert([[date] + row for date, row in zip(dates, values)])
+
+    def _to_frame(self, rows):
+        import pandas as pd
+        df = pd.DataFrame(rows, columns=['Date'] + self.columns)
+        df['Date'] = pd.to_datetime(df['Date'])
+        return df.set_index('Date')
+
+    def latest(self):
+        """Most recent row as a Series (named by its Date), or None when empty."""
+        with self.lock:
+            row = self.conn.execute(f'SELECT * FROM "{self.table}" ORDER BY "Date" DESC LIMIT 1').fetchone()
+        if row is None:
+            return None
+        return self._to_frame([row]).iloc[0]
+
+    def range(self, start_date=None, end_date=None):
+        """Rows with start_date <= Date <= end_date, same semantics as the old CSV filter."""
+        import pandas as pd
+        query = f'SELECT * FROM "{self.table}"'
+        conditions, params = [], []
+        if start_date:
+            conditions.append('"Date" >= ?')
+            params.append(pd.Timestamp(start_date).strftime(DATE_FORMAT))
+        if end_date:
+            conditions.append('"Date" <= ?')
+            params.append(pd.Timestamp(end_date).strftime(DATE_FORMAT))
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY "Date"'
+
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return self._to_frame(rows)
+
+    def checkpoint(self, attempts=5):
+        """Fold the WAL back into the main file so a plain copy of it is complete; False if readers kept it busy."""
+        for attempt in range(attempts):
+            with self.lock:
+                busy, _, _ = self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+            if not busy:
+                return True
+            time.sleep(2 ** attempt * 0.1)
+        return False
+
+    def migrate_csv(self, csv_path):
+        """Import an existing CSV once; rows already present are skipped."""
+        import pandas as pd
+        df = pd.read_csv(csv_path)
+        self.append(df)
+        return len(df)
+
+
+def migrate(path=DB_PATH):
+    for csv_path, (table, columns) in CSV_SOURCES.items():
+        try:
+            count = HistoryStore(table, columns, path).migrate_csv(csv_path)
+        except FileNotFoundError:
+            print(f"{csv_path}: not found, skipped")
+            continue
+        print(f"{csv_path}: {count} rows -> {table}")
+
+
+if __name__ == '__main__':
+    # python3 history_store.py --migrate
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--migrate', action='store_true')
+    # Before committing the file, e.g. from autopush.sh
+    parser.add_argument('--checkpoint', action='store_true')
+    parser.add_argument('--db', default=DB_PATH)
+    args = parser.parse_args()
+
+    if args.migrate:
+        migrate(args.db)
+    if args.checkpoint and not HistoryStore(path=args.db).checkpoint():
+        raise SystemExit('history.db is busy, WAL not checkpointed')
@@ -0,0 +1,36 @@
+from configs import HTTP_POOL_SIZE, HTTP_TIMEOUT
+
+
+def tune_session(session, pool_size=HTTP_POOL_SIZE, timeout=HTTP_TIMEOUT):
+    """Mount a keep-alive pool sized for our worker threads and a default timeout.
+
+    Each client keeps its own session (their default headers differ, e.g.
+    the Binance API key), but all of them get the same pooling and timeouts.
+    """
+    from requests.adapters import HTTPAdapter
+
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    request = session.request
+
+    def request_with_timeout(method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = timeout
+        return request(method, url, **kwargs)
+
+    session.request = request_with_timeout
+    return session
+
+
+def new_session(pool_size=HTTP_POOL_SIZE, timeout=HTTP_TIMEOUT):
+    import requests
+    return tune_session(requests.Session(), pool_size, timeout)
+
+
+def tune_urllib3_pool(pool_manager, timeout=HTTP_TIMEOUT):
+    # Pools are created lazily per host, so this applies to every later request
+    import urllib3
+    pool_manager.connection_pool_kw['timeout'] = urllib3.Timeout(total=timeout)
+    return pool_manager
@@ -0,0 +1,158 @@
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = 'cryptochecker'
+
+# Histogram bucket bounds in seconds, from a cache hit to a stuck exchange call
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Percentiles for /admin_stats come from the latest observations, not the coarse buckets
+RECENT = 1024
+
+
+class Timer:
+    """Count, sum, max, histogram buckets and recent samples of one phase's durations."""
+
+    __slots__ = ('count', 'total', 'max', 'buckets', 'recent')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.recent = deque(maxlen=RECENT)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.recent.append(seconds)
+
+    def quantile(self, q):
+        samples = sorted(self.recent)
+        return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0.0
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+
+class Metrics:
+    """Process-wide phase timers and counters, safe to update from any thread.
+
+    Phases are dotted names ('update.save', 'balance.gate'); exceptions
+    escaping a timer, or passed to `error()` from paths that swallow them,
+    are counted per phase and exception type.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timers = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, phase, seconds):
+        with self.lock:
+            timer = self.timers.get(phase)
+            if timer is None:
+                timer = self.timers[phase] = Timer()
+            timer.observe(seconds)
+
+    def error(self, phase, exc):
+        self.inc('errors_total', phase=phase, error=type(exc).__name__)
+
+    @contextmanager
+    def timer(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.error(phase, e)
+            raise
+        finally:
+            self.observe(phase, time.perf_counter() - start)
+
+    def register_gauges(self, name, func):
+        """`func()` returns a dict of label value -> number, read at scrape time."""
+        self.gauges[name] = func
+
+    def summary(self):
+        # (phase, count, p50, p95, max) sorted by total time spent
+        with self.lock:
+            timers = sorted(self.timers.items(), key=lambda item: item[1].total, reverse=True)
+            return [(phase, t.count, t.quantile(0.5), t.quantile(0.95), t.max) for phase, t in timers]
+
+    def error_counts(self):
+        with self.lock:
+            return {dict(labels)['phase'] + ':' + dict(labels)['error']: value
+                    for (name, labels), value in self.counters.items() if name == 'errors_total'}
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            lines += [f'# TYPE {PREFIX}_phase_seconds histogram']
+            for phase, timer in sorted(self.timers.items()):
+                labels = (('phase', phase),)
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), timer.buckets):
+                    cumulative += count
+                    lines.append(f'{PREFIX}_phase_seconds_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{PREFIX}_phase_seconds_sum{_format_labels(labels)} {timer.total}')
+                lines.append(f'{PREFIX}_phase_seconds_count{_format_labels(labels)} {timer.count}')
+
+            names = sorted({name for name, _ in self.counters})
+            for name in names:
+                lines.append(f'# TYPE {PREFIX}_{name} counter')
+                for (counter, labels), value in sorted(self.counters.items()):
+                    if counter == name:
+                        lines.append(f'{PREFIX}_{counter}{_format_labels(labels)} {value}')
+            gauges = list(self.gauges.items())
+
+        for name, func in gauges:
+            lines.append(f'# TYPE {PREFIX}_{name} gauge')
+            for key, value in sorted(func().items()):
+                lines.append(f'{PREFIX}_{name}{_format_labels([("name", key)])} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def serve_metrics(port, host='127.0.0.1', registry=metrics):
+    """Serve GET /metrics from a daemon thread; returns the server."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name='metrics').start()
+    return server
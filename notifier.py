@@ -0,0 +1,214 @@
+import asyncio
+import time
+from collections import namedtuple
+
+from configs import NOTIFY_CHAT_INTERVAL, NOTIFY_QUEUE_SIZE, NOTIFY_RATE, NOTIFY_WORKERS
+from metrics import metrics
+
+# Telegram rejects longer messages
+MAX_MESSAGE_LENGTH = 4096
+MAX_ATTEMPTS = 5
+
+# Outcomes passed to on_done
+SENT = 'sent'
+# Might go through later: network trouble, or flood control outlasting the retries
+FAILED = 'failed'
+# Telegram refused the message itself (BadRequest, e.g. chat not found); resending won't help
+REJECTED = 'rejected'
+# The chat can't be reached at all (Forbidden: the bot was blocked or kicked)
+BLOCKED = 'blocked'
+
+# One queued notification; on_done(status) is called exactly once
+Notification = namedtuple('Notification', ['text', 'on_done'])
+
+
+def retry_delay(error, attempt):
+    # RetryAfter carries the server's delay (int seconds, or a timedelta on newer
+    # python-telegram-bot); anything else backs off exponentially
+    value = getattr(error, 'retry_after', None)
+    if value is not None:
+        return value.total_seconds() if hasattr(value, 'total_seconds') else float(value)
+    return min(2 ** attempt, 30)
+
+
+def is_retryable(error):
+    from telegram.error import BadRequest, NetworkError, RetryAfter
+
+    # Forbidden (bot blocked) and BadRequest (chat not found) won't get better;
+    # TimedOut is a NetworkError
+    return isinstance(error, (RetryAfter, NetworkError)) and not isinstance(error, BadRequest)
+
+
+def failure_status(error):
+    from telegram.error import BadRequest, Forbidden
+
+    if isinstance(error, Forbidden):
+        return BLOCKED
+    if isinstance(error, BadRequest):
+        return REJECTED
+    return FAILED
+
+
+def split_messages(notifications):
+    """Join one chat's notifications into as few messages as fit, as (text, notifications) pairs."""
+    messages = []
+    for notification in notifications:
+        text = notification.text[:MAX_MESSAGE_LENGTH]
+        if messages and len(messages[-1][0]) + 1 + len(text) <= MAX_MESSAGE_LENGTH:
+            messages[-1] = (messages[-1][0] + '\n' + text, messages[-1][1] + [notification])
+        else:
+            messages.append((text, [notification]))
+    return messages
+
+
+class RateLimiter:
+    """Async token bucket: `rate` sends per second, evenly spaced.
+
+    The bucket holds a single token, so no one-second window ever sees more
+    than `rate` sends, even right after an idle period.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = 1
+        self.refilled_at = time.monotonic()
+        self.paused_until = 0
+        self.lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        # Flood control applies to the whole bot, not just the chat that hit it
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(1, self.tokens + (now - self.refilled_at) * self.rate)
+                self.refilled_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Notifier:
+    """Outbound Telegram messages, sent concurrently within the flood limits.
+
+    Notifications are queued per chat; everything queued for a chat by the
+    time a worker picks it up goes out as one message. At most `rate`
+    messages per second leave in total and one per `chat_interval` per
+    chat. RetryAfter pauses every sender for the server's delay, then the
+    message is retried. Each notification's on_done(status) tells the
+    caller whether it went out (SENT), may go out on a later try (FAILED),
+    or never will (REJECTED, BLOCKED), so alerts are only marked sent once
+    they were and undeliverable ones can be dropped.
+    """
+
+    def __init__(self, rate=NOTIFY_RATE, chat_interval=NOTIFY_CHAT_INTERVAL, workers=NOTIFY_WORKERS,
+                 max_queued=NOTIFY_QUEUE_SIZE):
+        self.limiter = RateLimiter(rate)
+        self.chat_interval = chat_interval
+        self.workers = workers
+        self.max_queued = max_queued
+        self.bot = None
+        self.tasks = []
+        # chat_id -> notifications not yet picked up; the queue holds each such chat once
+        self.pending = {}
+        self.queued = 0
+        self.queue = None
+        # chat_id -> earliest time its next message may go out
+        self.next_send = {}
+        self.idle = None
+
+    def start(self, bot):
+        """Start the workers on the running loop; later calls are no-ops."""
+        if self.tasks:
+            return
+        self.bot = bot
+        self.queue = asyncio.Queue()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, chat_id, text, on_done=None):
+        """Queue a message; False (and on_done is not called) when the queue is full."""
+        if self.queued >= self.max_queued:
+            metrics.inc('notify_dropped_total')
+            return False
+        self.queued += 1
+        self.idle.clear()
+        if chat_id in self.pending:
+            metrics.inc('notify_coalesced_total')
+            self.pending[chat_id].append(Notification(text, on_done))
+        else:
+            self.pending[chat_id] = [Notification(text, on_done)]
+            self.queue.put_nowait(chat_id)
+        return True
+
+    async def join(self):
+        """Wait until everything submitted so far was delivered or given up on."""
+        if self.idle is not None:
+            await self.idle.wait()
+
+    def stats(self):
+        return {'queued': self.queued, 'chats': len(self.pending)}
+
+    def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+
+    def _reserve(self, chat_id):
+        # Claims the chat's next send slot, so two workers never send to it within chat_interval
+        now = time.monotonic()
+        slot = max(now, self.next_send.get(chat_id, 0))
+        self.next_send[chat_id] = slot + self.chat_interval
+        if len(self.next_send) > 4 * self.max_queued:
+            self.next_send = {chat: at for chat, at in self.next_send.items() if at > now}
+        return slot - now
+
+    async def _worker(self):
+        while True:
+            chat_id = await self.queue.get()
+            notifications = self.pending.pop(chat_id)
+            try:
+                for text, batch in split_messages(notifications):
+                    status = await self._send(chat_id, text)
+                    for notification in batch:
+                        self._done(notification, status)
+            finally:
+                self.queued -= len(notifications)
+                if not self.queued:
+                    self.idle.set()
+
+    def _done(self, notification, status):
+        metrics.inc(f'notify_{status}_total')
+        if notification.on_done is not None:
+            try:
+                notification.on_done(status)
+            except Exception as e:
+                # A failing callback mustn't take the worker or the rest of the batch down
+                metrics.error('notify.ack', e)
+
+    async def _send(self, chat_id, text):
+        for attempt in range(MAX_ATTEMPTS):
+            await asyncio.sleep(self._reserve(chat_id))
+            await self.limiter.acquire()
+            try:
+                with metrics.timer('notify.send'):
+                    await self.bot.send_message(chat_id, text)
+                return SENT
+            except Exception as e:
+                metrics.error('notify.send', e)
+                if not is_retryable(e):
+                    return failure_status(e)
+                if attempt == MAX_ATTEMPTS - 1:
+                    return FAILED
+                delay = retry_delay(e, attempt)
+                if hasattr(e, 'retry_after'):
+                    self.limiter.pause(delay)
+                await asyncio.sleep(delay)
+        return FAILED
@@ -0,0 +1,71 @@
+import threading
+import time
+
+from metrics import metrics
+
+# Above this many symbols the all-symbols endpoint costs the same weight and
+# keeps the URL short
+ALL_SYMBOLS_THRESHOLD = 100
+MAX_AGE = 30
+
+
+class PriceService:
+    """One price table per refresh cycle, shared by every module.
+
+    `start_cycle` declares the symbols a cycle will need without touching
+    the network. The first `get` then resolves all of them with a single
+    ticker_price request, and every later reader in the cycle (other
+    threads included) is served from the same table. Only the owner of a
+    cycle (the bot's refresh, the watch loop) starts one; helpers that run
+    inside it, like take_snapshot, add their symbols with `want`.
+    """
+
+    def __init__(self, client, max_age=MAX_AGE):
+        self.client = client
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.prices = {}
+        self.wanted = set()
+        # Symbols the current table answers for, including unknown ones
+        self.covered = set()
+        self.fetched_at = None
+        self.requests = 0
+
+    def start_cycle(self, symbols=()):
+        with self.lock:
+            self.wanted = set(symbols)
+            self.fetched_at = None
+
+    def want(self, symbols):
+        # Joins the running cycle: the table is kept, only the set grows
+        with self.lock:
+            self.wanted |= set(symbols)
+
+    def _is_stale(self):
+        return self.fetched_at is None or time.monotonic() - self.fetched_at > self.max_age
+
+    def _fetch(self):
+        symbols = sorted(self.wanted)
+        if len(symbols) > ALL_SYMBOLS_THRESHOLD:
+            items = self.client.ticker_price()
+        else:
+            try:
+                items = self.client.ticker_price(symbols=symbols)
+            except Exception as e:
+                # One unknown or delisted symbol fails the whole batch
+                metrics.error('prices.batch', e)
+                items = self.client.ticker_price()
+        self.requests += 1
+        self.prices = {item['symbol']: float(item['price']) for item in items}
+        self.covered = set(symbols) | set(self.prices)
+        self.fetched_at = time.monotonic()
+
+    def get_many(self, symbols):
+        with self.lock:
+            self.wanted |= set(symbols)
+            if not self.covered.issuperset(symbols) or self._is_stale():
+                self._fetch()
+            return {symbol: self.prices[symbol] for symbol in symbols if symbol in self.prices}
+
+    def get(self, symbol, default=0):
+        return self.get_many([symbol]).get(symbol, default)
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import random
+import time
+
+from fetcher import run_blocking
+from metrics import metrics
+
+STREAM_URL = 'wss://stream.binance.com:9443/stream'
+STREAMS = ('miniTicker', 'bookTicker')
+# Prices older than this are treated as missing, so callers fall back to REST
+MAX_AGE = 60
+
+
+class PriceStream:
+    """Live price table fed by Binance's combined websocket streams.
+
+    `get_symbols` returns the symbols worth watching (alert coins and
+    holdings) and is re-read every `resync_interval` seconds while
+    connected, so subscriptions follow it. `on_tick(symbol, price)` is
+    awaited for every price update; its errors are counted, not allowed to
+    drop the connection. While the socket is down the table is kept fresh by
+    polling `price_service` (a PriceService), and the reconnect is retried
+    with exponential backoff. price() only answers with prices seen within
+    `max_age` seconds.
+    """
+
+    def __init__(self, price_service, get_symbols, on_tick, url=STREAM_URL, streams=STREAMS,
+                 poll_interval=10, resync_interval=5, max_backoff=60, max_age=MAX_AGE):
+        self.price_service = price_service
+        self.get_symbols = get_symbols
+        self.on_tick = on_tick
+        self.url = url
+        self.streams = streams
+        self.poll_interval = poll_interval
+        self.resync_interval = resync_interval
+        self.max_backoff = max_backoff
+        self.max_age = max_age
+        self.prices = {}
+        self.updated_at = {}
+        self.connected = False
+        self._stopped = False
+        self._request_id = 0
+
+    def price(self, symbol):
+        # None when never seen or too old, e.g. a symbol that stopped ticking
+        if time.time() - self.updated_at.get(symbol, 0) > self.max_age:
+            return None
+        return self.prices.get(symbol)
+
+    def stop(self):
+        self._stopped = True
+
+    async def _update(self, symbol, price):
+        self.prices[symbol] = price
+        self.updated_at[symbol] = time.time()
+        try:
+            await self.on_tick(symbol, price)
+        except Exception as e:
+            # One bad alert evaluation mustn't cost every symbol its stream
+            metrics.error('stream.tick', e)
+
+    async def _handle(self, message):
+        # Combined streams wrap the payload in {"stream": ..., "data": ...}
+        data = message.get('data', message)
+        if 's' not in data:
+            return
+        if 'c' in data:
+            price = float(data['c'])
+        elif 'b' in data and 'a' in data:
+            price = (float(data['b']) + float(data['a'])) / 2
+        else:
+            return
+        await self._update(data['s'], price)
+
+    def _stream_names(self):
+        return {f"{symbol.lower()}@{stream}" for symbol in self.get_symbols() for stream in self.streams}
+
+    async def _send(self, ws, method, params):
+        self._request_id += 1
+        await ws.send(json.dumps({'method': method, 'params': sorted(params), 'id': self._request_id}))
+
+    async def _stream(self):
+        import websockets
+
+        async with websockets.connect(self.url, ping_interval=20) as ws:
+            self.connected = True
+            subscribed = set()
+            resync_at = 0
+            try:
+                while not self._stopped:
+                    # The symbol set takes the alert engine's lock, so it is
+                    # re-read on a timer rather than for every message
+                    if time.monotonic() >= resync_at:
+                        wanted = self._stream_names()
+                        if wanted - subscribed:
+                            await self._send(ws, 'SUBSCRIBE', wanted - subscribed)
+                        if subscribed - wanted:
+                            await self._send(ws, 'UNSUBSCRIBE', subscribed - wanted)
+                        subscribed = wanted
+                        resync_at = time.monotonic() + self.resync_interval
+
+                    try:
+                        raw = await asyncio.wait_for(ws.recv(), timeout=max(resync_at - time.monotonic(), 0))
+                    except asyncio.TimeoutError:
+                        continue
+                    await self._handle(json.loads(raw))
+            finally:
+                self.connected = False
+
+    async def poll(self):
+        # Through the shared price table, which retries a batch rejected for
+        # one unknown symbol with the all-symbols endpoint
+        symbols = sorted(self.get_symbols())
+        if not symbols:
+            return
+        prices = await run_blocking(self.price_service.get_many, symbols)
+        for symbol, price in prices.items():
+            await self._update(symbol, price)
+
+    async def _poll_until(self, deadline):
+        while not self._stopped and time.monotonic() < deadline:
+            try:
+                await self.poll()
+            except Exception as e:
+                metrics.error('stream.poll', e)
+            await asyncio.sleep(min(self.poll_interval, max(deadline - time.monotonic(), 0)))
+
+    async def run(self):
+        backoff = 1
+        while not self._stopped:
+            started = time.monotonic()
+            try:
+                await self._stream()
+            except Exception as e:
+                metrics.error('stream.connect', e)
+
+            # A connection that stayed up for a while resets the backoff
+            if time.monotonic() - started > self.max_backoff:
+                backoff = 1
+            await self._poll_until(time.monotonic() + backoff * random.uniform(1, 1.5))
+            backoff = min(backoff * 2, self.max_backoff)
@@ -0,0 +1,69 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILE_DIR = 'profiles'
+SAMPLE_INTERVAL = 0.005
+
+
+def folded_stack(frame):
+    # root;...;leaf, the input format of flamegraph.pl and speedscope
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SlowCycleProfiler:
+    """Samples every thread's stack while a cycle runs; keeps it only if the cycle was slow.
+
+    Refreshes hop between the event loop and fetcher threads, so all
+    threads are sampled rather than just the caller's. Disabled when
+    `threshold` is 0.
+    """
+
+    def __init__(self, threshold, interval=SAMPLE_INTERVAL, directory=PROFILE_DIR):
+        self.threshold = threshold
+        self.interval = interval
+        self.directory = directory
+
+    def _sample(self, stacks, stop):
+        me = threading.get_ident()
+        while not stop.wait(self.interval):
+            # Pool threads start lazily, so names are looked up on every sample
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    stacks[f"{names.get(ident, ident)};{folded_stack(frame)}"] += 1
+
+    def dump(self, name, stacks):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{name}-{datetime.now():%Y%m%d-%H%M%S-%f}.folded")
+        with open(path, 'w') as file:
+            for stack, count in stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        return path
+
+    @contextmanager
+    def cycle(self, name):
+        if not self.threshold:
+            yield
+            return
+        stacks = Counter()
+        stop = threading.Event()
+        sampler = threading.Thread(target=self._sample, args=(stacks, stop), daemon=True, name='profiler')
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            sampler.join()
+            if time.perf_counter() - started >= self.threshold:
+                self.dump(name, stacks)
@@ -0,0 +1,153 @@
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Binance allows 6000 request weight per IP per minute; keep some headroom
+WEIGHT_BUDGET = 5000
+MAX_RETRIES = 5
+
+# Request weight of the Spot client methods we call
+ENDPOINT_WEIGHTS = {
+    'my_trades': 20,
+    'account': 20,
+    'balance': 60,
+    'ticker_price': 4,
+    'klines': 2,
+}
+DEFAULT_WEIGHT = 1
+
+request_priority = contextvars.ContextVar('request_priority', default=BACKGROUND)
+
+
+@contextmanager
+def interactive():
+    """Run the enclosed calls ahead of background refreshes."""
+    token = request_priority.set(INTERACTIVE)
+    try:
+        yield
+    finally:
+        request_priority.reset(token)
+
+
+def endpoint_weight(name, args, kwargs):
+    if name == 'ticker_price' and (args or kwargs.get('symbol')):
+        return 2
+    return ENDPOINT_WEIGHTS.get(name, DEFAULT_WEIGHT)
+
+
+def retry_after(error, attempt):
+    # 429/418 carry Retry-After; otherwise back off exponentially
+    headers = getattr(error, 'header', None) or {}
+    value = headers.get('Retry-After') or headers.get('retry-after')
+    return float(value) if value else min(2 ** attempt, 60)
+
+
+class RequestScheduler:
+    """Token bucket over Binance request weight, shared by every thread.
+
+    Calls wait until the bucket holds their weight; waiting interactive
+    calls are served before background ones. The bucket is also clamped to
+    what the X-MBX-USED-WEIGHT-1M header says is left this minute.
+    """
+
+    def __init__(self, budget=WEIGHT_BUDGET, max_retries=MAX_RETRIES):
+        self.budget = budget
+        self.max_retries = max_retries
+        self.tokens = budget
+        self.refill_rate = budget / 60
+        self.refilled_at = time.monotonic()
+        self.condition = threading.Condition()
+        self.waiting = []
+        self.sequence = itertools.count()
+        self.counters = {'calls': 0, 'queued': 0, 'throttled': 0, 'retried': 0, 'failed': 0}
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.budget, self.tokens + (now - self.refilled_at) * self.refill_rate)
+        self.refilled_at = now
+
+    def acquire(self, weight, priority):
+        weight = min(weight, self.budget)
+        with self.condition:
+            ticket = (priority, next(self.sequence))
+            heapq.heappush(self.waiting, ticket)
+            self.counters['queued'] += 1
+            throttled = False
+            while True:
+                self._refill()
+                if self.waiting[0] == ticket and self.tokens >= weight:
+                    break
+                throttled = throttled or self.waiting[0] == ticket
+                timeout = (weight - self.tokens) / self.refill_rate if self.waiting[0] == ticket else None
+                self.condition.wait(timeout)
+            heapq.heappop(self.waiting)
+            self.tokens -= weight
+            if throttled:
+                self.counters['throttled'] += 1
+            self.condition.notify_all()
+
+    def observe_headers(self, headers):
+        used = headers.get('X-MBX-USED-WEIGHT-1M') or headers.get('x-mbx-used-weight-1m')
+        if used is None:
+            return
+        with self.condition:
+            self._refill()
+            self.tokens = min(self.tokens, self.budget - int(used))
+
+    def call(self, name, func, *args, **kwargs):
+        weight = endpoint_weight(name, args, kwargs)
+        priority = request_priority.get()
+        attempt = 0
+        while True:
+            self.acquire(weight, priority)
+            with self.condition:
+                self.counters['calls'] += 1
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                status = getattr(e, 'status_code', None)
+                if status not in (418, 429) or attempt >= self.max_retries:
+                    with self.condition:
+                        self.counters['failed'] += 1
+                    raise
+                with self.condition:
+                    self.counters['retried'] += 1
+                    # Binance already considers us over budget
+                    self.tokens = min(self.tokens, 0)
+                time.sleep(retry_after(e, attempt))
+                attempt += 1
+
+    def stats(self):
+        with self.condition:
+            self._refill()
+            return dict(self.counters, waiting=len(self.waiting), tokens=round(self.tokens))
+
+
+class ScheduledClient:
+    """Wraps a Spot client so every method call goes through the scheduler."""
+
+    def __init__(self, client, scheduler):
+        self.client = client
+        self.scheduler = scheduler
+        # requests' response hook sees the used-weight header of every call
+        session = getattr(client, 'session', None)
+        if session is not None:
+            session.hooks['response'].append(lambda response, *args, **kwargs: scheduler.observe_headers(response.headers))
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+
+        def scheduled(*args, **kwargs):
+            return self.scheduler.call(name, attr, *args, **kwargs)
+        return scheduled
+
+
+scheduler = RequestScheduler()
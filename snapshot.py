@@ -0,0 +1,69 @@
+from collections import namedtuple
+from types import MappingProxyType
+
+ASSET_COLUMNS = ['Asset', 'Free', 'Average Price', 'Total Cost', 'Current Price', 'Current Value', 'Profit/Loss', 'Percentage Change']
+
+# One row of the asset table; namedtuples are immutable and slot-based
+AssetRecord = namedtuple('AssetRecord', ['asset', 'free', 'avg_price', 'total_cost', 'current_price', 'current_value', 'profit_loss', 'pct_change'])
+
+
+def asset_record(asset, free, current_price, total_cost, total_qty):
+    # Calculate the average cost
+    avg_price = total_cost / total_qty if total_qty > 0 else 0
+
+    # Current asset value
+    asset_value = free * current_price
+
+    # Calculate the percentage change
+    pct_change = ((current_price - avg_price) / avg_price) * 100 if avg_price > 0 else 0
+
+    # Calculate the profit or loss
+    profit_loss = asset_value - total_cost
+
+    return AssetRecord(asset, free, avg_price, total_cost, current_price, asset_value, profit_loss, pct_change)
+
+
+class PortfolioSnapshot:
+    """Everything one refresh cycle produced, frozen.
+
+    A new snapshot is built per cycle and published by swapping a single
+    reference, so concurrent readers never see half-updated state.
+    """
+
+    __slots__ = ('updated_at', 'usdt_idr_rate', 'prices', 'wallets', 'holdings', 'spot_symbols', 'assets',
+                 'total_asset_in_btc', 'total_asset_in_usdt', 'total_spot_value', 'total_profit_loss')
+
+    def __init__(self, updated_at, usdt_idr_rate, prices, wallets, holdings, spot_symbols, assets):
+        set_ = object.__setattr__
+        set_(self, 'updated_at', updated_at)
+        set_(self, 'usdt_idr_rate', usdt_idr_rate)
+        set_(self, 'prices', MappingProxyType(dict(prices)))
+        set_(self, 'wallets', MappingProxyType(dict(wallets)))
+        set_(self, 'holdings', MappingProxyType(dict(holdings)))
+        set_(self, 'spot_symbols', tuple(spot_symbols))
+        set_(self, 'assets', tuple(assets))
+
+        btc_price = self.prices.get('BTCUSDT', 0)
+        set_(self, 'total_spot_value', self.wallets.get('Spot', 0) * btc_price)
+        set_(self, 'total_asset_in_btc', sum(balance for balance in self.wallets.values() if balance > 0))
+        set_(self, 'total_asset_in_usdt', self.total_asset_in_btc * btc_price)
+        set_(self, 'total_profit_loss', sum(record.profit_loss for record in self.assets))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('PortfolioSnapshot is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('PortfolioSnapshot is immutable')
+
+    def to_frame(self, sort_by='Current Value'):
+        import pandas as pd
+        df = pd.DataFrame(self.assets, columns=ASSET_COLUMNS)
+        return df.sort_values(sort_by, ascending=False)
+
+
+def cross_venue_frame(venues, sort_by='Current Value'):
+    """One asset table over every venue; `venues` maps a venue name to its AssetRecords."""
+    import pandas as pd
+    frames = [pd.DataFrame(records, columns=ASSET_COLUMNS).assign(Venue=venue) for venue, records in venues.items()]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=ASSET_COLUMNS + ['Venue'])
+    return df[['Venue'] + ASSET_COLUMNS].sort_values(sort_by, ascending=False, ignore_index=True)
@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+
+class SnapshotCache:
+    """Keeps the latest portfolio snapshot for `ttl` seconds.
+
+    Callers arriving while a refresh is running share the same in-flight
+    fetch instead of starting their own.
+    """
+
+    def __init__(self, fetch, ttl):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.value = None
+        self.updated_at = 0
+        self._inflight = None
+
+    def is_fresh(self):
+        return self.value is not None and time.monotonic() - self.updated_at < self.ttl
+
+    async def _refresh(self):
+        try:
+            self.value = await self.fetch()
+            self.updated_at = time.monotonic()
+            return self.value
+        finally:
+            self._inflight = None
+
+    async def get(self, force=False):
+        if not force and self.is_fresh():
+            return self.value
+
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._refresh())
+
+        # shield so a cancelled command doesn't cancel the shared refresh
+        return await asyncio.shield(self._inflight)
@@ -1,98 +1,167 @@
-from binance_script import get_balance as binance_balance, client
-from gate_script import get_balance as gate_balance
-#from wallet_script import balance_usdt as wallet_balance
-import os
-import pandas as pd
+from binance_script import get_prices
+import binance_script
+from fetcher import run_blocking
+from request_scheduler import interactive, scheduler
+from connectors import aggregate, BinanceConnector, GateConnector, BitgetConnector, WalletConnector
+from snapshot_cache import SnapshotCache
+from history_store import HistoryStore
+from analytics import HistoryAnalytics, MAX_WINDOW as MAX_STATS_WINDOW
+from alert_engine import AlertEngine, OPERATORS, MOVE, CROSS, describe, is_one_shot, is_portfolio_coin, parse_window, price_key, split_price_key
+from price_stream import PriceStream, STREAM_URL
+from chart_renderer import ChartCache
+from access_control import AccessControl, ADMIN
+from tenants import Tenant, TenantStore, TenantRegistry, RefreshScheduler, portfolio_row
+from metrics import metrics, serve_metrics
+from profiler import SlowCycleProfiler
+from notifier import Notifier, SENT, REJECTED, BLOCKED
+import asyncio
 from datetime import datetime
-from configs import TELEGRAM_TOKEN
+from configs import TELEGRAM_TOKEN, SNAPSHOT_TTL, PRICE_STREAM, PRICE_STREAM_URL, METRICS_PORT, PROFILE_SLOW_SECONDS, ADMIN_USERS, ALERTS_PER_CHAT
 from telegram import Update
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes
-from matplotlib.ticker import FuncFormatter
-import matplotlib.pyplot as plt
 from datetime import datetime
 import textwrap
-from functools import wraps
-import operator as op
+from functools import partial, wraps
 
-filename = 'balance_vs_btc.csv'
-chartname = 'chart.png'
 refresh_time = 3 * 60 # 15 minutes
-wallet_balance = 7300
+connectors = [
+    BinanceConnector(),
+    GateConnector(),
+    BitgetConnector(holdings={'MANTA': 0}),
+    # Every address, chain and token in wallets.json, valued at Binance prices
+    WalletConnector(),
+]
 
-def read_whitelist():
-    with open('whitelist.txt', 'r') as file:
-        usernames = file.read().splitlines()
-    return usernames
+# Whitelist, roles and rate limits; the file is only reread when it changes
+access = AccessControl(admins=ADMIN_USERS)
+
+def command_name(update):
+    # "/chart@MyBot 2024-01-01" -> "chart"
+    return update.message.text.split()[0].lstrip('/').split('@')[0]
 
 def authorization(func):
     @wraps(func)
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
-        if update.effective_user.username not in read_whitelist() and str(update.effective_user.id) not in read_whitelist():
-            await update.message.reply_text('You are not authorized to use this bot.')
+        user = update.effective_user
+        denied = access.check(user.username, user.id, command_name(update))
+        if denied:
+            await update.message.reply_text(denied)
             return
         return await func(update, context, *args, **kwargs)
     return wrapper
 
-async def updateData(*args, **kwargs):
-    total_binance, usdt_idr_rate = binance_balance()
-    total_gate = gate_balance()
-    manta_bitget = 0
-    manta_price = client.ticker_price("MANTAUSDT")
-    total_bitget = manta_bitget * float(manta_price['price'])
-    total_usdt = total_binance + total_gate + wallet_balance + total_bitget
-    total_idr = total_usdt * usdt_idr_rate
-    btc_price = client.ticker_price("BTCUSDT")['price']
-    total_btc = total_usdt / float(btc_price)
-
-    # Check if the file exists
-    file_exists = os.path.isfile(filename)
-
-    df = pd.DataFrame({
-        'Date': [datetime.now()],
-        'BTC_Price': [btc_price],
-        'Binance_USDT': [total_binance],
-        'Gate_USDT': [total_gate],
-        'Other_USDT': [total_bitget + wallet_balance],
-        'Total_BTC': [total_btc],
-        'Total_USDT': [total_usdt],
-        'Total_IDR': [total_idr]
-    })
-
-    # Append the DataFrame to the CSV file
-    df.to_csv(filename, mode='a', header=not file_exists, index=False)
-
-    result = {
-        'usdt_idr_rate': usdt_idr_rate,
-        'btc_price': btc_price,
-        'total_binance': total_binance,
-        'usdt_idr_rate': usdt_idr_rate,
-        'total_gate': total_gate,
-        'total_bitget': total_bitget,
-        'total_usdt': total_usdt,
-        'total_idr': total_idr,
-        'total_btc': total_btc
-    }
+# Slow refreshes and charts leave flamegraph-ready stacks in profiles/
+profiler = SlowCycleProfiler(PROFILE_SLOW_SECONDS)
+
+# Built in init_services() so importing the bot has no disk or network side effects
+history = None
+analytics = None
+alert_engine = None
+price_stream = None
+chart_cache = ChartCache()
+
+tenants = None
+
+def init_services():
+    global history, analytics, alert_engine, tenants
+    history = HistoryStore()
+    # Drawdown, volatility and rollups for /stats, kept in step with every saved row
+    analytics = HistoryAnalytics(history)
+    alert_engine = AlertEngine()
+    tenants = TenantRegistry(TenantStore())
+
+def save_data(df):
+    analytics.append(df)
+
+# Spot symbols of the configured account's holdings. The balance path never
+# reads the account, so they are fetched alongside it on every refresh and
+# used by the next cycle and the price stream
+held_spot_symbols = {"BTCUSDT"}
+
+def held_symbols():
+    return held_spot_symbols
+
+def refresh_held_symbols():
+    global held_spot_symbols
+    try:
+        held_spot_symbols = set(binance_script.spot_symbols(binance_script.get_spot_asset()))
+    except Exception as e:
+        # Keep the last known holdings
+        metrics.error('update.holdings', e)
+
+def cycle_symbols():
+    from wallet_script import price_symbols
+
+    # Everything priced during one refresh: FX, BTC, Bitget, wallets, holdings and alert coins
+    symbols = {"USDTIDRT", "BTCUSDT", "MANTAUSDT"} | price_symbols() | held_symbols()
+    return symbols | {f"{coin}USDT" for coin in alert_engine.coins() if not is_portfolio_coin(coin)}
+
+async def fetchData():
+    with profiler.cycle('update'), metrics.timer('update'):
+        return await _fetchData()
+
+async def _fetchData():
+    get_prices().start_cycle(cycle_symbols())
+
+    # Every venue and the FX/BTC prices are fetched concurrently, each venue
+    # bounded by its own timeout
+    with metrics.timer('update.fetch'):
+        balances, prices, _ = await asyncio.gather(
+            aggregate(connectors),
+            run_blocking(get_prices().get_many, ["USDTIDRT", "BTCUSDT"]),
+            run_blocking(refresh_held_symbols),
+        )
+    df, result = portfolio_row(balances, prices)
+
+    # A row with a stale venue holds its last known value, or 0 if it never
+    # answered; stored, it would fire Total_* alerts and set /stats drawdowns
+    if result['stale']:
+        metrics.inc('history_skipped_total')
+    else:
+        with metrics.timer('update.save'):
+            await run_blocking(save_data, df)
 
     return result
 
+# One fetch + one CSV row per real refresh, shared by every command and the job
+snapshot_cache = SnapshotCache(fetchData, SNAPSHOT_TTL)
 
+async def updateData(*args, force=False, **kwargs):
+    return await snapshot_cache.get(force=force)
+
+async def refreshData(context: ContextTypes.DEFAULT_TYPE):
+    await updateData(force=True)
+
+def chat_portfolio(update):
+    # (snapshot cache, history, analytics) of the chat's own account, or the configured one
+    portfolio = tenants.get(update.message.chat_id)
+    if portfolio is None:
+        return snapshot_cache, history, analytics
+    return portfolio.cache, portfolio.history, portfolio.analytics
+
+
+
+def stale_mark(data, name):
+    return ' (stale)' if name in data['stale'] else ''
 
 @authorization
 async def sendInfo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    data = await updateData()
+    cache, _, _ = chat_portfolio(update)
+    with interactive():
+        data = await cache.get()
     message = textwrap.dedent(f"""
     {datetime.now()}
     USD to IDR Rate: {format(data['usdt_idr_rate'], ',.0f')}
           
-    === BINANCE ===
+    === BINANCE ==={stale_mark(data, 'binance')}
     Total Asset in USDT: {format(data['total_binance'], ',.0f')}
     Total Asset in IDR: {format(data['total_binance'] * data['usdt_idr_rate'], ',.0f')}
 
-    === GATE.IO ===
+    === GATE.IO ==={stale_mark(data, 'gate')}
     Total Asset in USDT: {data['total_gate']}
     Total Asset in IDR: {format(data['total_gate'] * data['usdt_idr_rate'], ',.0f')}
 
-    === Bitget ===
+    === Bitget ==={stale_mark(data, 'bitget')}
     Total Asset in USDT: {format(data['total_bitget'], ',.0f')}
     Total Asset in IDR: {format(data['total_bitget'] * data['usdt_idr_rate'], ',.0f')}
 
@@ -107,134 +176,144 @@ async def sendInfo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 
 
-def millions(x, pos):
-    'The two args are the value and tick position'
-    return '%1.1fM' % (x * 1e-6)
-
-
 @authorization
 async def sendChart(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    await updateData()
+    with profiler.cycle('chart'), metrics.timer('chart'):
+        await _sendChart(update, context)
+
+async def _sendChart(update, context):
+    cache, chat_history, _ = chat_portfolio(update)
+    with interactive():
+        await cache.get()
     
     start_date = context.args[0] if len(context.args) > 0 else None
     end_date = context.args[1] if len(context.args) > 1 else None
 
-    df = pd.read_csv(filename)
-    df['Date'] = pd.to_datetime(df['Date'])
-    df.set_index('Date', inplace=True)
-    formatter = FuncFormatter(millions)
-
-    if start_date:
-        df = df[df.index >= start_date]
-    if end_date:
-        df = df[df.index <= end_date]
-
-    # Create a figure and a set of subplots
-    fig, axs = plt.subplots(3, 1, figsize=(10, 10))
-
-    # Plot the BTC price data on the first subplot
-    axs[0].plot(df.index, df['BTC_Price'], color='g', label='BTC Price')
-    axs[0].set_ylabel('BTC Price')
-    axs[0].set_title('BTC Price and Total BTC Over Time')
-    axs[0].legend(loc='upper left')
-
-    # Create a second y-axis for the first subplot that shares the same x-axis
-    ax4 = axs[0].twinx()
-
-    # Plot the Total BTC data on the second y-axis of the first subplot
-    ax4.plot(df.index, df['Total_BTC'], color='b', label='Total BTC')
-    ax4.set_ylabel('Total BTC')
-    ax4.legend(loc='upper right')
-
-    # Plot the Binance USDT data on the second subplot
-    axs[1].plot(df.index, df['Binance_USDT'], color='r', label='Binance USDT')
-    axs[1].set_ylabel('Binance USDT')
-    axs[1].set_title('Binance and Gate io USDT Value Over Time')
-    axs[1].legend(loc='upper left')
-
-
-    # Create a second y-axis for the second subplot that shares the same x-axis
-    ax2 = axs[1].twinx()
-
-
-    # Plot the Gate io USDT data on the second y-axis of the second subplot
-    ax2.plot(df.index, df['Gate_USDT'], color='b', label='Gate USDT')
-    ax2.set_ylabel('Gate USDT')
-    ax2.legend(loc='upper right')
-
-    # Plot the USDT data on the second subplot
-    axs[2].plot(df.index, df['Total_USDT'], color='r', label='USDT')
-    axs[2].set_ylabel('Value in USDT')
-    axs[2].set_title('USDT and IDR Value Over Time')
-    axs[2].legend(loc='upper left')
-
-    # Create a second y-axis for the second subplot that shares the same x-axis
-    ax3 = axs[2].twinx()
-
-    # Plot the IDR data on the second y-axis of the second subplot
-    ax3.plot(df.index, df['Total_IDR'], color='b', label='IDR')
-    ax3.set_ylabel('Value in IDR')
-    ax3.legend(loc='upper right')
-
-    # Apply the formatter to the y-axis of the second plot
-    ax3.yaxis.set_major_formatter(formatter)
-
-    # Adjust the layout
-    plt.tight_layout()
-
-    # Show the plot
-    plt.savefig(chartname)
-    with open(chartname, 'rb') as photo:
-        last_modified = datetime.fromtimestamp(os.path.getmtime(filename))
-        await update.message.reply_photo(photo=photo, caption=f"{last_modified}")
-    
-    os.remove(chartname)
-    plt.close()
+    last_modified = chat_history.latest().name
+
+    async def load():
+        with metrics.timer('chart.load'):
+            return await run_blocking(chat_history.range, start_date, end_date)
+
+    # Served from cache until a new history row arrives
+    png = await chart_cache.get((chat_history.table, start_date, end_date, last_modified), load)
+    await update.message.reply_photo(photo=png, caption=f"{last_modified}")
+
+# Alerts whose notification is queued or being sent, so a later check or a
+# fast tick can't fire them twice
+sending_alerts = set()
+
+# Every alert notification goes through here, within Telegram's flood limits
+notifier = Notifier()
+
+def alert_delivered(alert, status):
+    # One-shot alerts leave the store only once their message is out; one
+    # that failed for now stays and fires again on the next check. Alerts that
+    # can never be delivered are dropped, or they would fire on every tick
+    if status == SENT:
+        if is_one_shot(alert):
+            alert_engine.remove([alert.id])
+        metrics.inc('alerts_fired_total')
+    elif status == BLOCKED:
+        # The bot was blocked or removed: none of the chat's alerts can reach it
+        alert_engine.remove([a.id for a in alert_engine.list(alert.chat_id)])
+        metrics.inc('alerts_dropped_total', reason=status)
+    elif status == REJECTED:
+        alert_engine.remove([alert.id])
+        metrics.inc('alerts_dropped_total', reason=status)
+    sending_alerts.discard(alert.id)
+
+async def send_alerts(bot, triggered, prices):
+    notifier.start(bot)
+    for alert in triggered:
+        if alert.id in sending_alerts:
+            continue
+        sending_alerts.add(alert.id)
+        text = f'Price alert: {describe(alert)}, now {prices[price_key(alert)]:g}'
+        if not notifier.submit(alert.chat_id, text, partial(alert_delivered, alert)):
+            sending_alerts.discard(alert.id)
+
+async def trigger_alerts(bot, coin, current_price):
+    # Only this coin's slice of the alert table is compared
+    await send_alerts(bot, alert_engine.evaluate(coin, current_price), {coin: current_price})
+
+def maintain_alerts(app):
+    # New alerts sit in a small side table until the big one is rebuilt, and
+    # changes in the journal until the snapshot is rewritten; at 100k alerts
+    # each takes a few hundred ms, so never on the event loop
+    if alert_engine.needs_recompile():
+        app.create_task(run_blocking(alert_engine.recompile))
+    if alert_engine.needs_compact():
+        app.create_task(run_blocking(alert_engine.compact))
 
 async def check_alerts(context: ContextTypes.DEFAULT_TYPE):
-    # Load the alerts from the CSV file
-    df = pd.read_csv('alerts.csv')
-
-
-    # Map the operator strings to actual operator functions
-    operators = {'<': op.lt, '>': op.gt, '<=': op.le, '>=': op.ge, '==': op.eq}
-
-    # Get the distinct coins
-    distinct_coins = df['coin'].unique()
-
-    # Get the current prices of the distinct coins
-    current_prices = {}
+    with profiler.cycle('alerts'), metrics.timer('alerts'):
+        await _check_alerts(context)
+
+def portfolio_values(keys):
+    # Total_* alerts read their own chat's latest history row: the tenant's
+    # portfolio, or the configured account's for chats without keys
+    rows = {}
+    values = {}
+    for key in keys:
+        coin, chat_id = split_price_key(key)
+        if chat_id not in rows:
+            portfolio = tenants.get(chat_id)
+            rows[chat_id] = (portfolio.history if portfolio else history).latest()
+        row = rows[chat_id]
+        if row is not None and coin in row:
+            values[key] = float(row[coin])
+    return values
+
+async def _check_alerts(context):
+    # Only coins that currently have alerts are looked up
+    distinct_coins = alert_engine.coins()
+
+    # One price vector for every coin: each chat's Total_* values from its
+    # latest history row, the rest from the stream or one batched REST lookup
+    portfolio_keys = [key for key in distinct_coins if is_portfolio_coin(key)]
+    current_prices = await run_blocking(portfolio_values, portfolio_keys) if portfolio_keys else {}
+    rest_coins = []
     for coin in distinct_coins:
-        if 'Total' in coin:
-            balance_df = pd.read_csv(filename)
-            current_prices[coin] = float(balance_df.tail(1)[coin].item())
+        if is_portfolio_coin(coin):
+            continue
+        elif price_stream and price_stream.price(f"{coin}USDT") is not None:
+            # Only prices the stream saw recently; stale ones go to REST below
+            current_prices[coin] = price_stream.price(f"{coin}USDT")
         else:
-            current_prices[coin] = float(client.ticker_price(f"{coin}USDT")['price'])
+            rest_coins.append(coin)
 
-    # Check each alert
-    for index, row in df.iterrows():
-        current_price = current_prices[row['coin']]
+    if rest_coins:
+        with metrics.timer('alerts.prices'):
+            prices = await run_blocking(get_prices().get_many, [f"{coin}USDT" for coin in rest_coins])
+        current_prices.update({coin: prices[f"{coin}USDT"] for coin in rest_coins if f"{coin}USDT" in prices})
 
-        # If the current price matches the alert condition, send an alert message and delete the alert
-        if operators[row['operator']](current_price, row['price']):
-            await context.bot.send_message(row['chat_id'], f'Price alert: {row["coin"]} is now {row["operator"]} {row["price"]}')
-            df = df.drop(index)
+    # Every alert compared in one vectorized pass
+    with metrics.timer('alerts.evaluate'):
+        triggered = alert_engine.evaluate_many(current_prices)
+    await send_alerts(context.bot, triggered, current_prices)
+    # Fired one-shot alerts leave masked rows and journal entries behind
+    maintain_alerts(context.application)
 
-    # Write the DataFrame back to the CSV file
-    df.to_csv('alerts.csv', index=False, header=True)
+def watched_symbols():
+    # Alert coins (except derived Total_* values) plus current holdings
+    symbols = {f"{coin}USDT" for coin in alert_engine.coins() if not is_portfolio_coin(coin)}
+    return symbols | held_symbols()
 
-async def list_alerts(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    # Load the alerts from the CSV file
-    df = pd.read_csv('alerts.csv')
+async def start_price_stream(app):
+    global price_stream
 
-    # Filter the alerts for the current chat
-    df = df[df['chat_id'] == update.message.chat_id]
-    df = df.drop(columns='chat_id')
+    async def on_tick(symbol, price):
+        if symbol.endswith('USDT'):
+            await trigger_alerts(app.bot, symbol[:-len('USDT')], price)
 
-    # Format the DataFrame as a list of strings
-    alerts = []
-    for index, row in df.iterrows():
-        alerts.append(f"{row['coin']} {row['operator']} {row['price']}")
+    price_stream = PriceStream(get_prices(), watched_symbols, on_tick, url=PRICE_STREAM_URL or STREAM_URL)
+    app.create_task(price_stream.run())
+
+@authorization
+async def list_alerts(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # Format the alerts of the current chat as a list of strings
+    alerts = [describe(alert) for alert in alert_engine.list(update.message.chat_id)]
 
     # Concatenate all alerts into a single string
     alerts_message = '\n'.join(alerts)
@@ -242,6 +321,7 @@ async def list_alerts(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     # Send a message with the list of alerts
     await update.message.reply_text(alerts_message)
 
+@authorization
 async def delete_alert(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     # Check if the correct number of arguments were provided
     if len(context.args) != 1:
@@ -252,32 +332,33 @@ async def delete_alert(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     chat_id = update.message.chat_id
     coin = context.args[0]
 
-    # Load the alerts from the CSV file
-    df = pd.read_csv('alerts.csv')
-
     # Delete the alert
-    df = df[(df.chat_id != chat_id) | (df.coin != coin)]
-
-    # Write the DataFrame back to the CSV file
-    df.to_csv('alerts.csv', index=False, header=True)
+    alert_engine.delete(chat_id, coin)
 
     # Send a confirmation message
     await update.message.reply_text(f'Alert for {coin} deleted')
 
 
+CREATE_ALERT_USAGE = '''Usage:
+/create_alert <coin> <operator> <price>
+/create_alert <coin> move <percent> <window, e.g. 1h>
+/create_alert <coin> cross <price> [<hysteresis percent, default 0.5>]'''
+
+@authorization
 async def create_alert(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     # Check if the correct number of arguments were provided
-    if len(context.args) != 3:
-        await update.message.reply_text('Invalid number of arguments. Usage: /create_alert <coin> <operator> <price>')
+    operator = context.args[1] if len(context.args) > 1 else None
+    expected = {MOVE: (4,), CROSS: (3, 4)}.get(operator, (3,))
+    if len(context.args) not in expected:
+        await update.message.reply_text('Invalid number of arguments. ' + CREATE_ALERT_USAGE)
         return
 
     # Get the coin name, the operator, and the alert price from the message
     coin = context.args[0]
-    operator = context.args[1]
 
     # Check if the operator is valid
-    if operator not in ['<', '>', '<=', '>=', '==']:
-        await update.message.reply_text('Invalid operator. Please use one of the following operators: <, >, <=, >=, ==')
+    if operator not in OPERATORS:
+        await update.message.reply_text(f"Invalid operator. Please use one of the following operators: {', '.join(OPERATORS)}")
         return
 
     # Check if the price is a valid number
@@ -287,28 +368,148 @@ async def create_alert(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         await update.message.reply_text('Invalid price. Please enter a valid number.')
         return
 
-    # Create a DataFrame with the alert data
-    df = pd.DataFrame([[update.message.chat_id, coin, operator, price]], columns=['chat_id', 'coin', 'operator', 'price'])
+    # Window of a move alert, hysteresis band of a crossing alert
+    try:
+        if operator == MOVE:
+            param = parse_window(context.args[3])
+        elif operator == CROSS:
+            param = float(context.args[3]) if len(context.args) > 3 else 0.5
+        else:
+            param = 0.0
+    except ValueError as e:
+        await update.message.reply_text(str(e))
+        return
+
+    # Portfolio values are the chat's own account; without keys that's the
+    # configured account, which only admins may watch
+    user = update.effective_user
+    is_admin = access.role(user.username, user.id) == ADMIN
+    if is_portfolio_coin(coin) and await run_blocking(tenants.get, update.message.chat_id) is None and not is_admin:
+        await update.message.reply_text('Alerts on Total_* values need this chat\'s own keys, see /register.')
+        return
 
-    # Check if the file exists
-    if not os.path.isfile('alerts.csv'):
-        df.to_csv('alerts.csv', mode='w', header=True, index=False)
-    else:
-        df.to_csv('alerts.csv', mode='a', header=False, index=False)
+    # Every alert is a stream subscription and journal entry
+    if not is_admin and alert_engine.count(update.message.chat_id) >= ALERTS_PER_CHAT:
+        await update.message.reply_text(f'This chat already has {ALERTS_PER_CHAT} alerts, delete some with /delete_alert first.')
+        return
+
+    # Index and journal the alert
+    alert = alert_engine.add(update.message.chat_id, coin, operator, price, param)
+    maintain_alerts(context.application)
 
     # Send a confirmation message
-    await update.message.reply_text(f'Alert created for {coin} {operator} {price}')
+    await update.message.reply_text(f'Alert created for {describe(alert)}')
+
+STATS_LABELS = {
+    'Total_USDT': 'USDT',
+    'Total_IDR': 'IDR',
+    # The portfolio measured in BTC: its change is the performance against holding BTC
+    'Total_BTC': 'vs BTC',
+    'BTC_Price': 'BTC',
+}
+
+def format_percent(value, sign='+'):
+    # NaN when there are too few rows in the window
+    return 'n/a' if value != value else f"{value * 100:{sign}.2f}%"
+
+@authorization
+async def sendPortfolioStats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    window = context.args[0] if context.args else 'all'
+    try:
+        seconds = None if window == 'all' else parse_window(window, MAX_STATS_WINDOW)
+    except ValueError as e:
+        await update.message.reply_text(f'{e}\nUsage: /stats [window], e.g. /stats 24h, /stats 30d or /stats all')
+        return
+
+    _, _, chat_analytics = chat_portfolio(update)
+    # Only the first call reads the history; after that it's the running aggregates
+    report = await run_blocking(chat_analytics.report, seconds)
+    if not report:
+        await update.message.reply_text('No history yet.')
+        return
+
+    lines = [f"Portfolio over {window}", f"{'':<8}{'change':>9}{'max DD':>9}{'vol/yr':>9}"]
+    for column, label in STATS_LABELS.items():
+        stats = report.get(column)
+        if stats:
+            lines.append(f"{label:<8}{format_percent(stats['change']):>9}{format_percent(stats['max_drawdown']):>9}"
+                         f"{format_percent(stats['volatility'], sign='-'):>9}")
+    await update.message.reply_text('\n'.join(lines))
+
+@authorization
+async def sendStats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    lines = [f"{'phase':<16}{'n':>6}{'p50':>9}{'p95':>9}{'max':>9}"]
+    for phase, count, p50, p95, slowest in metrics.summary():
+        lines.append(f"{phase:<16}{count:>6}{p50 * 1000:>7.0f}ms{p95 * 1000:>7.0f}ms{slowest * 1000:>7.0f}ms")
+    errors = metrics.error_counts()
+    if errors:
+        lines += ["", "errors:"] + [f"{name} {count}" for name, count in sorted(errors.items())]
+    requests = scheduler.stats()
+    lines += ["", "binance: " + ' '.join(f"{name} {value}" for name, value in requests.items())]
+    lines.append("notify: " + ' '.join(f"{name} {value}" for name, value in notifier.stats().items()))
+    await update.message.reply_text('\n'.join(lines))
+
+@authorization
+async def register(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if len(context.args) not in (2, 4):
+        await update.message.reply_text('Usage: /register <binance_key> <binance_secret> [<gate_key> <gate_secret>]')
+        return
+
+    binance_key, binance_secret, *gate = context.args
+    gate_key, gate_secret = gate if gate else (None, None)
+    await run_blocking(tenants.register, Tenant(update.message.chat_id, binance_key, binance_secret, gate_key, gate_secret))
+
+    # The message holds the secrets; don't leave it in the chat
+    try:
+        await update.message.delete()
+    except Exception as e:
+        metrics.error('register.delete', e)
+    await context.bot.send_message(update.message.chat_id, 'Keys saved. /info and /chart now show this chat\'s own portfolio.')
+
+@authorization
+async def unregister(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    removed = await run_blocking(tenants.unregister, update.message.chat_id)
+    if removed:
+        # Without keys its Total_* alerts would read the configured account instead
+        alert_engine.remove([alert.id for alert in alert_engine.list(update.message.chat_id) if is_portfolio_coin(alert.coin)])
+    await update.message.reply_text('Keys removed.' if removed else 'This chat has no keys registered.')
+
+async def post_init(app):
+    # Tenants of this process's shard, staggered over the refresh interval
+    app.create_task(RefreshScheduler(tenants, refresh_time).run())
+    # Rebuild the /stats aggregates now rather than on the first /stats
+    app.create_task(run_blocking(analytics.get))
+    notifier.start(app.bot)
+    if PRICE_STREAM:
+        # Alerts fire on each websocket tick instead of waiting for the job
+        await start_price_stream(app)
+
+@authorization
+async def reload_whitelist(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    count = await run_blocking(access.reload)
+    await update.message.reply_text(f'Whitelist reloaded, {count} users')
 
 def main():
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+    init_services()
+    metrics.register_gauges('binance_requests', scheduler.stats)
+    metrics.register_gauges('notify', notifier.stats)
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT)
+
+    app = ApplicationBuilder().token(TELEGRAM_TOKEN).post_init(post_init).build()
 
     app.add_handler(CommandHandler("info", sendInfo))
     app.add_handler(CommandHandler("chart", sendChart))
     app.add_handler(CommandHandler("create_alert", create_alert))
     app.add_handler(CommandHandler("delete_alert", delete_alert))
     app.add_handler(CommandHandler("list_alerts", list_alerts))
+    app.add_handler(CommandHandler("stats", sendPortfolioStats))
+    app.add_handler(CommandHandler("admin_stats", sendStats))
+    app.add_handler(CommandHandler("reload_whitelist", reload_whitelist))
+    app.add_handler(CommandHandler("register", register))
+    app.add_handler(CommandHandler("unregister", unregister))
 
-    app.job_queue.run_repeating(updateData, interval=refresh_time, first=0)
+    app.job_queue.run_repeating(refreshData, interval=refresh_time, first=0)
     app.job_queue.run_repeating(check_alerts, interval=refresh_time, first=0)
     app.run_polling()
 
@@ -0,0 +1,273 @@
+import argparse
+import asyncio
+import heapq
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from configs import SNAPSHOT_TTL, TENANT_CONCURRENCY, TENANT_SHARD
+from connectors import aggregate, BinanceConnector, GateConnector
+from fetcher import run_blocking, using_executor
+from analytics import HistoryAnalytics
+from history_store import DB_PATH as HISTORY_PATH, HistoryStore
+from metrics import metrics
+from snapshot_cache import SnapshotCache
+
+DB_PATH = 'tenants.db'
+# Tenants' value histories; kept out of history.db, which autopush.sh publishes
+HISTORY_DB_PATH = 'tenant_history.db'
+REFRESH_INTERVAL = 3 * 60
+
+# Tenant refreshes run on their own threads so a slow venue can't starve the
+# configured account's /info; three calls per refreshing tenant (Binance,
+# Gate.io, prices)
+executor = ThreadPoolExecutor(max_workers=3 * TENANT_CONCURRENCY, thread_name_prefix='tenant')
+
+Tenant = namedtuple('Tenant', ['chat_id', 'binance_key', 'binance_secret', 'gate_key', 'gate_secret'])
+
+
+class TenantStore:
+    """Chats with their own exchange credentials, in a SQLite file only we can read."""
+
+    def __init__(self, path=DB_PATH):
+        created = not os.path.exists(path)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        if created:
+            os.chmod(path, 0o600)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS tenants (chat_id INTEGER PRIMARY KEY, binance_key TEXT, binance_secret TEXT,'
+                ' gate_key TEXT, gate_secret TEXT)'
+            )
+
+    def save(self, tenant):
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO tenants VALUES (?, ?, ?, ?, ?)', tuple(tenant))
+
+    def remove(self, chat_id):
+        with self.lock, self.conn:
+            return self.conn.execute('DELETE FROM tenants WHERE chat_id = ?', (chat_id,)).rowcount > 0
+
+    def get(self, chat_id):
+        with self.lock:
+            row = self.conn.execute('SELECT * FROM tenants WHERE chat_id = ?', (chat_id,)).fetchone()
+        return Tenant(*row) if row else None
+
+    def all(self):
+        with self.lock:
+            return [Tenant(*row) for row in self.conn.execute('SELECT * FROM tenants ORDER BY chat_id')]
+
+
+def move_tenant_histories(source=HISTORY_PATH, target=HISTORY_DB_PATH):
+    """Move tenant_* tables an older version left in history.db to the private file."""
+    if not os.path.exists(source):
+        return 0
+    conn = sqlite3.connect(source)
+    try:
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'tenant\\_%' ESCAPE '\\'")]
+        for table in tables:
+            # Created with the usual schema, then filled; rows already there are kept
+            HistoryStore(table=table, path=target).conn.close()
+            with conn:
+                conn.execute('ATTACH DATABASE ? AS private', (target,))
+                conn.execute(f'INSERT OR IGNORE INTO private."{table}" SELECT * FROM main."{table}"')
+                conn.execute(f'DROP TABLE main."{table}"')
+            conn.execute('DETACH DATABASE private')
+        if tables:
+            conn.execute('VACUUM')
+    finally:
+        conn.close()
+    return len(tables)
+
+
+def portfolio_row(balances, prices):
+    """One history row and the /info summary from aggregated venue balances and FX/BTC prices."""
+    import pandas as pd
+
+    usdt = {name: balance['usdt'] for name, balance in balances.items()}
+    total_binance = usdt.get('binance', 0)
+    total_gate = usdt.get('gate', 0)
+    total_bitget = usdt.get('bitget', 0)
+    total_usdt = sum(usdt.values())
+    usdt_idr_rate = prices['USDTIDRT']
+    btc_price = prices['BTCUSDT']
+    total_idr = total_usdt * usdt_idr_rate
+    total_btc = total_usdt / float(btc_price)
+
+    df = pd.DataFrame({
+        'Date': [datetime.now()],
+        'BTC_Price': [btc_price],
+        'Binance_USDT': [total_binance],
+        'Gate_USDT': [total_gate],
+        'Other_USDT': [total_usdt - total_binance - total_gate],
+        'Total_BTC': [total_btc],
+        'Total_USDT': [total_usdt],
+        'Total_IDR': [total_idr]
+    })
+
+    result = {
+        'usdt_idr_rate': usdt_idr_rate,
+        'btc_price': btc_price,
+        'total_binance': total_binance,
+        'total_gate': total_gate,
+        'total_bitget': total_bitget,
+        'total_usdt': total_usdt,
+        'total_idr': total_idr,
+        'total_btc': total_btc,
+        'stale': [name for name, balance in balances.items() if balance['stale']]
+    }
+    return df, result
+
+
+class Portfolio:
+    """A tenant's connectors, value history with its analytics, and snapshot cache."""
+
+    def __init__(self, tenant, ttl=SNAPSHOT_TTL):
+        self.tenant = tenant
+        self.connectors = [BinanceConnector(tenant.binance_key, tenant.binance_secret)]
+        if tenant.gate_key:
+            self.connectors.append(GateConnector(tenant.gate_key, tenant.gate_secret))
+        self.history = HistoryStore(table=f'tenant_{tenant.chat_id}', path=HISTORY_DB_PATH)
+        self.analytics = HistoryAnalytics(self.history)
+        self.cache = SnapshotCache(self.fetch, ttl)
+
+    async def fetch(self):
+        from binance_script import get_prices
+
+        with metrics.timer('tenant.update'), using_executor(executor):
+            # Prices are public and come from the shared per-cycle table
+            balances, prices = await asyncio.gather(
+                aggregate(self.connectors),
+                run_blocking(get_prices().get_many, ["USDTIDRT", "BTCUSDT"]),
+            )
+            df, result = portfolio_row(balances, prices)
+            # Like the bot's own refresh, rows with a stale venue aren't stored
+            if result['stale']:
+                metrics.inc('tenant_history_skipped_total')
+            else:
+                await run_blocking(self.analytics.append, df)
+        return result
+
+
+def parse_shard(shard):
+    index, count = (int(part) for part in shard.split('/'))
+    if not 0 <= index < count:
+        raise ValueError(f'Invalid shard {shard!r}, expected <index>/<count>')
+    return index, count
+
+
+def refresh_offset(chat_id, interval):
+    # Stable spread over the interval, so adding a tenant doesn't move the others
+    return (chat_id * 2654435761) % 2**32 / 2**32 * interval
+
+
+class TenantRegistry:
+    """Portfolios of every registered chat, built on first use."""
+
+    def __init__(self, store):
+        self.store = store
+        move_tenant_histories()
+        self.portfolios = {}
+        self.lock = threading.Lock()
+
+    def get(self, chat_id):
+        with self.lock:
+            portfolio = self.portfolios.get(chat_id)
+            if portfolio is None:
+                tenant = self.store.get(chat_id)
+                if tenant is None:
+                    return None
+                portfolio = self.portfolios[chat_id] = Portfolio(tenant)
+            return portfolio
+
+    def register(self, tenant):
+        self.store.save(tenant)
+        with self.lock:
+            # New credentials: drop the old clients' portfolio
+            self.portfolios.pop(tenant.chat_id, None)
+
+    def unregister(self, chat_id):
+        with self.lock:
+            self.portfolios.pop(chat_id, None)
+        return self.store.remove(chat_id)
+
+
+class RefreshScheduler:
+    """Refreshes every tenant of this shard once per interval, staggered.
+
+    Each tenant has a fixed offset inside the interval, so refreshes are
+    spread out instead of all firing at once, and at most `concurrency`
+    run at the same time. A tenant whose last refresh is still running is
+    skipped for that round. Tenants added or removed are picked up when
+    the tenant list is reread, once per interval.
+    """
+
+    def __init__(self, registry, interval=REFRESH_INTERVAL, concurrency=TENANT_CONCURRENCY, shard=TENANT_SHARD):
+        self.registry = registry
+        self.interval = interval
+        self.shard, self.shards = parse_shard(shard)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.running = {}
+        self._stopped = False
+
+    def owned(self, chat_id):
+        return chat_id % self.shards == self.shard
+
+    def _schedule(self, start):
+        # (due time, chat_id) for every tenant of this shard in the round starting at `start`
+        return [(start + refresh_offset(tenant.chat_id, self.interval), tenant.chat_id)
+                for tenant in self.registry.store.all() if self.owned(tenant.chat_id)]
+
+    async def _refresh(self, chat_id):
+        try:
+            async with self.semaphore:
+                portfolio = self.registry.get(chat_id)
+                if portfolio is not None:
+                    await portfolio.cache.get(force=True)
+        except Exception as e:
+            metrics.error('tenant.refresh', e)
+        finally:
+            self.running.pop(chat_id, None)
+
+    async def run(self):
+        round_start = time.monotonic()
+        due = await run_blocking(self._schedule, round_start)
+        heapq.heapify(due)
+        while not self._stopped:
+            if not due:
+                # Next round, with the tenant list reread
+                round_start += self.interval
+                due = await run_blocking(self._schedule, round_start)
+                heapq.heapify(due)
+                if not due:
+                    await asyncio.sleep(max(round_start + self.interval - time.monotonic(), 0))
+                    continue
+
+            when, chat_id = heapq.heappop(due)
+            await asyncio.sleep(max(when - time.monotonic(), 0))
+            if chat_id in self.running:
+                metrics.inc('tenant_skipped_total')
+                continue
+            self.running[chat_id] = asyncio.ensure_future(self._refresh(chat_id))
+
+    def stop(self):
+        self._stopped = True
+
+
+if __name__ == '__main__':
+    # Extra refresh workers, one per shard: python3 tenants.py --shard 1/4
+    # (the bot process itself runs shard TENANT_SHARD, usually 0/N)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shard', default=TENANT_SHARD)
+    parser.add_argument('--interval', type=int, default=REFRESH_INTERVAL)
+    args = parser.parse_args()
+
+    async def main():
+        await RefreshScheduler(TenantRegistry(TenantStore()), args.interval, shard=args.shard).run()
+
+    asyncio.run(main())
@@ -0,0 +1,36 @@
+import sys
+
+CLEAR_SCREEN = '\x1b[2J\x1b[H'
+CLEAR_LINE = '\x1b[K'
+
+
+def move_to(row):
+    return f'\x1b[{row + 1};1H'
+
+
+class DiffRenderer:
+    """Redraws only the terminal lines that changed since the last frame."""
+
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.lines = None
+
+    def draw(self, lines):
+        if self.lines is None:
+            self.out.write(CLEAR_SCREEN)
+            previous = []
+        else:
+            previous = self.lines
+
+        chunks = []
+        for row, line in enumerate(lines):
+            if row >= len(previous) or previous[row] != line:
+                chunks.append(move_to(row) + line + CLEAR_LINE)
+        # Blank out rows left over from a longer previous frame
+        for row in range(len(lines), len(previous)):
+            chunks.append(move_to(row) + CLEAR_LINE)
+        chunks.append(move_to(len(lines)))
+
+        self.out.write(''.join(chunks))
+        self.out.flush()
+        self.lines = list(lines)
@@ -0,0 +1,122 @@
+import sqlite3
+import threading
+import time
+
+from metrics import metrics
+
+DB_PATH = 'trades.db'
+PAGE_LIMIT = 1000
+# Binance's "Invalid symbol." error code
+INVALID_SYMBOL = -1121
+# Pairs found missing are skipped for this long, then tried again in case they got listed
+UNLISTED_RECHECK = 7 * 24 * 3600
+
+
+class TradeStore:
+    """Local SQLite copy of Binance trades plus the running cost basis per asset."""
+
+    def __init__(self, path=DB_PATH):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS trades (
+                    symbol TEXT NOT NULL,
+                    id INTEGER NOT NULL,
+                    time INTEGER NOT NULL,
+                    price REAL NOT NULL,
+                    qty REAL NOT NULL,
+                    is_buyer INTEGER NOT NULL,
+                    PRIMARY KEY (symbol, id)
+                )""")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS cost_basis (
+                    asset TEXT PRIMARY KEY,
+                    total_cost REAL NOT NULL,
+                    total_qty REAL NOT NULL
+                )""")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS unlisted_pairs (
+                    symbol TEXT PRIMARY KEY,
+                    checked_at INTEGER NOT NULL
+                )""")
+
+    def last_trade_id(self, symbol):
+        with self.lock:
+            row = self.conn.execute("SELECT MAX(id) FROM trades WHERE symbol = ?", (symbol,)).fetchone()
+        return row[0] if row[0] is not None else -1
+
+    def is_unlisted(self, symbol, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            row = self.conn.execute("SELECT checked_at FROM unlisted_pairs WHERE symbol = ?", (symbol,)).fetchone()
+        return row is not None and now - row[0] < UNLISTED_RECHECK
+
+    def mark_unlisted(self, symbol, now=None):
+        now = time.time() if now is None else now
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO unlisted_pairs VALUES (?, ?)", (symbol, int(now)))
+
+    def get_cost_basis(self, asset):
+        with self.lock:
+            row = self.conn.execute("SELECT total_cost, total_qty FROM cost_basis WHERE asset = ?", (asset,)).fetchone()
+        return row if row else (0, 0)
+
+    def load_frame(self):
+        # Already-parsed trades for every symbol, ready for cost_basis.cost_basis
+        import pandas as pd
+        from cost_basis import split_symbol
+
+        with self.lock:
+            df = pd.read_sql_query("SELECT symbol, id, time, price, qty, is_buyer FROM trades", self.conn)
+        df['asset'] = df.pop('symbol').map(split_symbol)
+        df['is_buyer'] = df['is_buyer'].astype(bool)
+        return df.sort_values(['asset', 'time', 'id'], kind='stable', ignore_index=True)
+
+    def save(self, asset, trades, total_cost, total_qty):
+        # trades and the new running state are committed together so a crash
+        # can never apply the same trade twice
+        rows = [(t['symbol'], t['id'], t['time'], float(t['price']), float(t['qty']), int(t['isBuyer'])) for t in trades]
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO trades VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self.conn.execute("INSERT OR REPLACE INTO cost_basis VALUES (?, ?, ?)", (asset, total_cost, total_qty))
+
+
+def fetch_new_trades(client, store, symbol):
+    # Page forward from the last stored id; the first sync starts at id 0
+    trades = []
+    from_id = store.last_trade_id(symbol) + 1
+    while True:
+        page = client.my_trades(symbol, fromId=from_id, limit=PAGE_LIMIT)
+        trades += page
+        if len(page) < PAGE_LIMIT:
+            return trades
+        from_id = page[-1]['id'] + 1
+
+
+def sync_asset(client, store, asset):
+    from cost_basis import QUOTES, apply_trades
+
+    new_trades = []
+    for quote in QUOTES:
+        symbol = asset + quote
+        # e.g. most assets have no FDUSD pair; asking again costs a weight-20 call that fails
+        if store.is_unlisted(symbol):
+            continue
+        try:
+            new_trades += fetch_new_trades(client, store, symbol)
+        except Exception as e:
+            if getattr(e, 'error_code', None) == INVALID_SYMBOL:
+                store.mark_unlisted(symbol)
+                metrics.inc('trades_unlisted_total', quote=quote)
+                continue
+            if quote == QUOTES[0]:
+                raise
+            metrics.error(f'trades.{quote}', e)
+
+    total_cost, total_qty = store.get_cost_basis(asset)
+    if new_trades:
+        total_cost, total_qty = apply_trades(total_cost, total_qty, new_trades)
+        store.save(asset, new_trades, total_cost, total_qty)
+
+    return total_cost, total_qty
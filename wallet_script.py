@@ -1,21 +1,175 @@
-from binance.spot import Spot as Client
-from configs import BINANCE_API_KEY, BINANCE_SECRET, WALLET_ADDRESS
-from web3 import Web3
+import json
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from binance_script import get_prices
+from configs import WALLET_ADDRESS, WALLETS_FILE
+from http_session import new_session
+from metrics import metrics
 
-# Connect to an Optimism node
-w3 = Web3(Web3.HTTPProvider('https://mainnet.optimism.io'))
+# balanceOf(address)
+BALANCE_OF = '0x70a08231'
+# Public RPCs cap batch sizes; bigger scans are split into several batches
+BATCH_LIMIT = 100
+STABLECOINS = {'USDT', 'USDC', 'USDC.E', 'DAI', 'FDUSD'}
 
-client = Client(BINANCE_API_KEY, BINANCE_SECRET)
-eth_price = client.ticker_price("ETHUSDT")
+Chain = namedtuple('Chain', ['name', 'rpc', 'native'])
+Token = namedtuple('Token', ['chain', 'symbol', 'address', 'decimals'])
 
+# Without a wallets file: the native ETH of WALLET_ADDRESS on Optimism, as before
+DEFAULT_CHAINS = [Chain('optimism', 'https://mainnet.optimism.io', 'ETH')]
 
-# Get the balance
-balance = w3.eth.get_balance(WALLET_ADDRESS) / 10**18
-balance_usdt = balance * float(eth_price['price'])
 
+def load_wallets(path=WALLETS_FILE):
+    """(chains, addresses, tokens) from a JSON file like
 
-if __name__ == '__main__':
-    print(f"ETH Balance: {balance}")
-    print(f"Total Asset in USDT: {balance_usdt}")
+    {"chains": {"optimism": {"rpc": "https://mainnet.optimism.io", "native": "ETH"}},
+     "addresses": ["0x..."],
+     "tokens": [{"chain": "optimism", "symbol": "USDC", "address": "0x...", "decimals": 6}]}
+    """
+    if not os.path.isfile(path):
+        return DEFAULT_CHAINS, [WALLET_ADDRESS] if WALLET_ADDRESS else [], []
+    with open(path) as file:
+        config = json.load(file)
+    chains = [Chain(name, chain['rpc'], chain.get('native', 'ETH')) for name, chain in config['chains'].items()]
+    tokens = [Token(token['chain'], token['symbol'], token['address'], int(token.get('decimals', 18)))
+              for token in config.get('tokens', [])]
+    return chains, config.get('addresses', []), tokens
+
+
+def balance_of_call(token, address):
+    return {'to': token.address, 'data': BALANCE_OF + address[2:].lower().rjust(64, '0')}
+
+
+def decode_amount(result, decimals):
+    # eth_call on a non-contract returns '0x'
+    return int(result, 16) / 10**decimals if result and result != '0x' else 0.0
+
+
+class RpcError(Exception):
+    pass
+
+
+class WalletScanner:
+    """Native and ERC-20 balances of many addresses on many chains.
+
+    Each chain costs one JSON-RPC batch (per `batch_limit` calls) with every
+    balance read at the latest block. Chains are scanned concurrently; one
+    failing call only zeroes that balance, and a failing chain falls back to
+    its last scanned holdings without taking the others down.
+    """
+
+    def __init__(self, chains, addresses, tokens, session=None, batch_limit=BATCH_LIMIT):
+        self.chains = chains
+        self.addresses = addresses
+        self.tokens = tokens
+        self.session = session or new_session()
+        self.batch_limit = batch_limit
+        # chain name -> holdings of its last successful scan
+        self.last = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max(len(chains), 1), thread_name_prefix='wallet')
+
+    def _post(self, chain, payload):
+        response = self.session.post(chain.rpc, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    def _batch(self, chain, calls):
+        # calls: list of (method, params); results come back in call order,
+        # None for a call that failed on its own
+        results = []
+        for start in range(0, len(calls), self.batch_limit):
+            chunk = calls[start:start + self.batch_limit]
+            payload = [{'jsonrpc': '2.0', 'id': start + i, 'method': method, 'params': params}
+                       for i, (method, params) in enumerate(chunk)]
+            by_id = {item['id']: item for item in self._post(chain, payload)}
+            for i in range(start, start + len(chunk)):
+                item = by_id.get(i)
+                if item is None or 'error' in item:
+                    metrics.error(f'wallet.{chain.name}', RpcError(item.get('error') if item else 'missing response'))
+                    results.append(None)
+                else:
+                    results.append(item['result'])
+        return results
+
+    def scan_chain(self, chain):
+        """Total holdings per symbol on `chain`, summed over every address."""
+        tokens = [token for token in self.tokens if token.chain == chain.name]
+        calls = [('eth_getBalance', [address, 'latest']) for address in self.addresses]
+        calls += [('eth_call', [balance_of_call(token, address), 'latest']) for token in tokens for address in self.addresses]
+        results = self._batch(chain, calls)
 
+        holdings = {chain.native: sum(decode_amount(result, 18) for result in results[:len(self.addresses)])}
+        token_results = iter(results[len(self.addresses):])
+        for token in tokens:
+            amount = sum(decode_amount(next(token_results), token.decimals) for _ in self.addresses)
+            holdings[token.symbol] = holdings.get(token.symbol, 0) + amount
 
+        with self.lock:
+            self.last[chain.name] = holdings
+        return holdings
+
+    def scan(self):
+        """chain name -> {symbol: amount}; a failed chain reports its last holdings, or is left out."""
+        if not self.addresses:
+            return {}
+        futures = {chain.name: self.executor.submit(self.scan_chain, chain) for chain in self.chains}
+        scan = {}
+        for name, future in futures.items():
+            try:
+                scan[name] = future.result()
+            except Exception as e:
+                metrics.error(f'wallet.{name}', e)
+                with self.lock:
+                    if name in self.last:
+                        scan[name] = self.last[name]
+        return scan
+
+
+def total_holdings(scan):
+    holdings = {}
+    for chain_holdings in scan.values():
+        for symbol, amount in chain_holdings.items():
+            holdings[symbol] = holdings.get(symbol, 0) + amount
+    return holdings
+
+
+def value_usdt(holdings):
+    # Stablecoins at par, everything else at its Binance USDT price
+    priced = [symbol for symbol in holdings if symbol.upper() not in STABLECOINS]
+    prices = get_prices().get_many([f"{symbol}USDT" for symbol in priced])
+    return sum(amount if symbol.upper() in STABLECOINS else amount * prices.get(f"{symbol}USDT", 0)
+               for symbol, amount in holdings.items())
+
+
+@lru_cache(maxsize=None)
+def get_scanner():
+    return WalletScanner(*load_wallets())
+
+
+def price_symbols():
+    # USDT pairs the valuation will ask for, so they can join the cycle's batch
+    scanner = get_scanner()
+    symbols = [chain.native for chain in scanner.chains] + [token.symbol for token in scanner.tokens]
+    return {f"{symbol}USDT" for symbol in symbols if symbol.upper() not in STABLECOINS}
+
+
+def get_balance():
+    scanner = get_scanner()
+    scan = scanner.scan()
+    missing = [chain.name for chain in scanner.chains if chain.name not in scan] if scanner.addresses else []
+    if missing:
+        # A chain never scanned would understate the total; failing lets the connector report it stale
+        raise RpcError(f"No holdings yet for {', '.join(missing)}")
+    holdings = total_holdings(scan)
+    return holdings, value_usdt(holdings)
+
+
+if __name__ == '__main__':
+    holdings, balance_usdt = get_balance()
+    for symbol, amount in sorted(holdings.items()):
+        print(f"{symbol} Balance: {amount}")
+    print(f"Total Asset in USDT: {balance_usdt}")